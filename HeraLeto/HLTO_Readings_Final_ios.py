@@ -3,6 +3,15 @@ from bleak import BleakScanner
 from datetime import datetime
 import csv
 import os
+import sys
+import time
+from pathlib import Path
+
+from hera_advert_decode import decode_advert
+
+# Stream-health monitor lives in ../python
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+from stream_health import StreamMonitor  # noqa: E402
 
 # ----------------------------------------------------------------------
 # CONFIG
@@ -17,6 +26,18 @@ CSV_PATH = "hera_advert_metrics.csv"
 csv_file = None
 csv_writer = None
 
+# Distinct adverts in a row with the same vital before it counts as stuck.
+# Distinct adverts arrive every ~3 s, and integer respiration rates or a
+# 0.1 C temperature can legitimately hold for minutes; 200 is ~10 min.
+ADVERT_FROZEN_SAMPLES = 200
+
+# Advert rate / gaps / repeated payloads / stuck vitals, on the PC clock.
+# The same advert is often seen several times; raw_hex flags those repeats.
+advert_health = StreamMonitor(
+    "hera_advert", ("heart_rate_bpm", "respiration_rate_bpm", "temperature_c"),
+    frozen_samples=ADVERT_FROZEN_SAMPLES,
+)
+
 
 # ----------------------------------------------------------------------
 # CSV HELPERS
@@ -78,24 +99,14 @@ def advertisement_callback(device, advertisement_data):
     for manufacturer_id, raw_data in advertisement_data.manufacturer_data.items():
         hex_data = raw_data.hex()
 
-        heart_rate = None
-        respiration_rate = None
-        temperature = None
-        spo2 = None
-
-        # Hera Leto payload layout (from your original final.py):
-        #   raw_data[3]      -> heart rate (bpm)
-        #   raw_data[5]      -> respiration rate (breaths/min)
-        #   raw_data[10:12]  -> temp * 100, little-endian (°C)
-        #   raw_data[-5]     -> SpO2 (%), 151 means "still reading"
-        if len(raw_data) >= 12:
-            heart_rate = raw_data[3]
-            respiration_rate = raw_data[5]
-            temperature = int.from_bytes(raw_data[10:12], byteorder="little") / 100.0
-
-            spo2_val = raw_data[-5]
-            # In your original script, 151 meant "Still reading for SpO2"
-            spo2 = None if spo2_val == 151 else spo2_val
+        # Payload layout lives in hera_advert_decode.ADVERT_FIELDS so the
+        # offline re-decoder stays in lockstep with this callback.
+        vitals = decode_advert(raw_data)
+        heart_rate = vitals["heart_rate_bpm"]
+        respiration_rate = vitals["respiration_rate_bpm"]
+        temperature = vitals["temperature_c"]
+        spo2 = vitals["spo2_pct"]
+        advert_health.update(time.time_ns(), (heart_rate, respiration_rate, temperature), key=hex_data)
 
         # Console debug output
         print(f"\n[{current_time}] {device.address} ({name})  RSSI {rssi} dBm")
@@ -147,6 +158,7 @@ async def scan_ble():
                 await asyncio.sleep(2.0)
     finally:
         print("🔴 Stopping BLE scanning.")
+        advert_health.print_summary()
         close_csv()
 
 
@@ -2,6 +2,8 @@ import asyncio
 from bleak import BleakScanner
 from datetime import datetime
 
+from hera_advert_decode import decode_advert
+
 TARGET_MAC = "C0:22:19:03:01:CC" 
 
 def advertisement_callback(device, advertisement_data):
@@ -22,11 +24,12 @@ def advertisement_callback(device, advertisement_data):
             print(f"Manufacturer ID: {manufacturer_id} | Raw Data: {hex_data}")
 
             if len(raw_data) >= 12:
-                heart_rate = raw_data[3]  
-                respiration_rate = raw_data[5]  
-                temperature = int.from_bytes(raw_data[10:12], byteorder="little") / 100.0  
-                spo2 = raw_data[-5]
-                if spo2 == 151:
+                vitals = decode_advert(raw_data)
+                heart_rate = vitals["heart_rate_bpm"]
+                respiration_rate = vitals["respiration_rate_bpm"]
+                temperature = vitals["temperature_c"]
+                spo2 = vitals["spo2_pct"]
+                if spo2 is None:
                     spo2 = "Still reading for Sp02"
 
                 print(f"Heart Rate: {heart_rate} bpm")
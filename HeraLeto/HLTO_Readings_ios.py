@@ -2,9 +2,16 @@ import asyncio
 from datetime import datetime
 import csv
 import os
+import sys
+import time
+from pathlib import Path
 
 from bleak import BleakScanner, BleakClient
 
+# Stream-health monitor lives in ../python
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+from stream_health import StreamMonitor  # noqa: E402
+
 # Match the BLE name you saw: "HLTO - 01CC"
 TARGET_NAME_KEYWORD = "HLTO"
 
@@ -27,18 +34,34 @@ def open_csv(path: str, header=None):
     return f, writer
 
 
+def make_health_monitors() -> dict:
+    """One stream-health monitor per logged stream."""
+    return {
+        "repdat1": StreamMonitor("hera_repdat1"),
+        # Timing only: a steady heart rate repeats the same bpm for
+        # minutes, which is not a frozen sensor
+        "hr": StreamMonitor("hera_hr"),
+        "temp": StreamMonitor("hera_temp"),
+    }
+
+
 def make_notification_handler(
     char_uuid: str,
     rep_writer=None,
     spo2_writer=None,
     hrtemp_writer=None,
+    health=None,
 ):
     CUSTOM_LOG_UUID = "40af0003-9479-43f6-ae95-c45fb2afb9d2"
     HR_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
     TEMP_UUID = "00002a1c-0000-1000-8000-00805f9b34fb"
 
+    health = health or make_health_monitors()
+    rep_health, hr_health, temp_health = health["repdat1"], health["hr"], health["temp"]
+
     def handler(sender: int, data: bytearray):
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        now_ns = time.time_ns()
 
         # 1) Vendor-specific Hera Leto DSP text stream
         if char_uuid == CUSTOM_LOG_UUID:
@@ -73,6 +96,7 @@ def make_notification_handler(
                         # Join the rest back into a single string; we’ll decode later
                         rest = ",".join(fields[1:]) if len(fields) > 1 else ""
                         rep_writer.writerow([ts, device_ts, rest])
+                        rep_health.update(now_ns, key=device_ts)
                     except Exception as e:
                         print("    (REP_DAT1 parse error:", e, ")")
 
@@ -93,6 +117,9 @@ def make_notification_handler(
 
             if hrtemp_writer is not None and heart_rate is not None:
                 hrtemp_writer.writerow([ts, "hr", heart_rate])
+                # With RR intervals (flag bit 4) the payload changes every
+                # beat, so an identical one is a re-delivered packet
+                hr_health.update(now_ns, key=bytes(data) if flags & 0x10 else None)
 
         # 3) Standard Temperature Measurement (0x2A1C)
         elif char_uuid == TEMP_UUID:
@@ -101,6 +128,9 @@ def make_notification_handler(
             if hrtemp_writer is not None:
                 # Just log hex for now; we’ll decode to °C later
                 hrtemp_writer.writerow([ts, "temp_raw", data.hex()])
+                # Timing only: the temperature payload stays the same
+                # from one reading to the next while the skin temp is steady
+                temp_health.update(now_ns)
 
         # 4) Any other notifiable characteristic -> debug-only
         else:
@@ -175,6 +205,7 @@ async def run():
             print("No notifiable characteristics found.")
             return
 
+        health = make_health_monitors()
         print("\nSubscribing to these characteristics:")
         for char in notifiable_chars:
             print(
@@ -186,6 +217,7 @@ async def run():
                 rep_writer=rep_writer,
                 spo2_writer=spo2_writer,
                 hrtemp_writer=hrtemp_writer,
+                health=health,
             )
             await client.start_notify(char.uuid, handler)
 
@@ -208,6 +240,10 @@ async def run():
             spo2_file.close()
             hrtemp_file.close()
 
+            for monitor in health.values():
+                if monitor.count:
+                    monitor.print_summary()
+
 
 if __name__ == "__main__":
     asyncio.run(run())
@@ -1,89 +1,245 @@
-import pandas as pd
+import argparse
+import io
+import json
+import os
+import sys
 from pathlib import Path
 
-# --- 1. Load your CSVs ---
-base = Path("/Users/azyl/ABI_Work/MagicLeap2Reading/HeraLeto")  # adjust if needed
-
-rep = pd.read_csv(base / "hera_repdat1.csv")
-hrtemp = pd.read_csv(base / "hera_hr_temp.csv")
-
-# --- 2. Split the REP_DAT1 'values' string into numeric columns f1..fN ---
+import numpy as np
+import pandas as pd
 
-def split_to_numbers(value_str):
-    parts = str(value_str).split(",")
-    nums = []
-    for p in parts:
-        p = p.strip()
-        if p == "":
-            continue
+# Shared CSV loader lives in ../python
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "python"))
+from csv_cache import TIME_COLUMNS, load_csv, parse_time_ns  # noqa: E402
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+# Default to the folder this script lives in; override with --base
+DEFAULT_BASE = Path(__file__).resolve().parent
+
+REP_CSV = "hera_repdat1.csv"
+HR_TEMP_CSV = "hera_hr_temp.csv"
+DECODED_CSV = "hera_repdat1_decoded.csv"
+
+# Sidecar next to the decoded CSV remembering how far into REP_CSV we got
+CHECKPOINT_SUFFIX = ".offset.json"
+
+# f1 values that mean "no HR yet" in REP_DAT1
+HR_SENTINELS = (0, 255)
+
+
+# ----------------------------------------------------------------------
+# DECODING
+# ----------------------------------------------------------------------
+def decode_values(values: pd.Series, n_fields: int = None) -> np.ndarray:
+    """
+    Turn the REP_DAT1 'values' strings ("0,0,...,1,0") into a float64
+    matrix of shape (rows, n_fields) in one pass of pandas' C parser.
+    Short rows are padded with NaN, non-numeric fields become NaN.
+    """
+    values = values.fillna("").astype(str)
+    if len(values) == 0:
+        return np.empty((0, n_fields or 0), dtype=np.float64)
+
+    if n_fields is None:
+        n_fields = int(values.str.count(",").max()) + 1
+
+    mat = pd.read_csv(
+        # every line terminated, so trailing empty rows are not lost
+        io.StringIO("".join(v + "\n" for v in values)),
+        header=None,
+        names=range(n_fields),
+        skip_blank_lines=False,
+    )
+    # Columns with a stray non-numeric token come back as object
+    for col in mat.columns[mat.dtypes == object]:
+        mat[col] = pd.to_numeric(mat[col], errors="coerce")
+
+    return mat.to_numpy(dtype=np.float64)
+
+
+def read_new_rows(path: Path, offset: int = 0, include_tail: bool = False):
+    """
+    Read CSV rows appended to `path` after byte `offset`.
+    Returns (DataFrame, new_offset, n_tail). A last line without a
+    newline may still be being written: it is only parsed with
+    include_tail=True, as the last row (n_tail=1), and only if it parses;
+    new_offset always points before it.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = max(offset, f.tell())
+        f.seek(start)
+        chunk = f.read()
+
+    end = chunk.rfind(b"\n") + 1
+    tail = chunk[end:]
+    if include_tail and tail.strip():
         try:
-            nums.append(float(p))
-        except ValueError:
-            nums.append(float("nan"))
-    return nums
-
-# parse once so we don't keep recomputing
-parsed = rep["values"].apply(split_to_numbers)
-max_len = parsed.map(len).max()
-
-for i in range(max_len):
-    colname = f"f{i+1}"
-    rep[colname] = parsed.apply(
-        lambda lst, idx=i: lst[idx] if idx < len(lst) else float("nan")
+            df = pd.read_csv(io.BytesIO(header + chunk + b"\n"), dtype={"values": str})
+            return df, start + end, 1
+        except pd.errors.ParserError:
+            pass   # cut off mid-field
+    df = pd.read_csv(io.BytesIO(header + chunk[:end]), dtype={"values": str})
+    return df, start + end, 0
+
+
+def load_hr_char(path: Path, cache: bool = True) -> pd.DataFrame:
+    """
+    HR rows from the standard HR characteristic log, time-sorted.
+    cache=False skips the csv_cache sidecar next to the log.
+    """
+    hrtemp = load_csv(path, cache=cache)
+    hr_df = hrtemp[hrtemp["type"] == "hr"].copy()
+    hr_df["value"] = pd.to_numeric(hr_df["value"], errors="coerce")
+    return hr_df[["pc_time_ns", "value"]].sort_values("pc_time_ns", kind="stable")
+
+
+def decode_repdat1(rep: pd.DataFrame, hr_df: pd.DataFrame, n_fields: int = None) -> pd.DataFrame:
+    """
+    Expand REP_DAT1 rows into f1..fN, expose HR (f1 without sentinels)
+    and attach the nearest HR-characteristic reading for comparison.
+    """
+    mat = decode_values(rep["values"], n_fields)
+    n_fields = mat.shape[1]
+    fcols = [f"f{i+1}" for i in range(n_fields)]
+
+    out = rep[["pc_time", "device_ts"]].copy()
+    out[fcols] = mat
+
+    f1 = mat[:, 0] if n_fields else np.full(len(rep), np.nan)
+    out["hr_from_repdat1"] = np.where(np.isin(f1, HR_SENTINELS), np.nan, f1)
+    out["pc_time_ns"] = parse_time_ns(out["pc_time"], TIME_COLUMNS["pc_time"])
+
+    merged = pd.merge_asof(
+        out.sort_values("pc_time_ns", kind="stable"),
+        hr_df,
+        on="pc_time_ns",
+        direction="nearest",
+        tolerance=1_000_000_000,  # 1 s
     )
-
-# --- 3. Expose HR from REP_DAT1 (f1, ignoring sentinel values 0 and 255) ---
-
-def extract_hr_from_f1(x):
-    if pd.isna(x) or x in (0, 255):
-        return float("nan")
-    return x
-
-rep["hr_from_repdat1"] = rep["f1"].apply(extract_hr_from_f1)
-
-# --- 4. Attach HR from the standard HR characteristic for comparison ---
-
-hr_df = hrtemp[hrtemp["type"] == "hr"].copy()
-
-# convert to datetime + numeric
-hr_df["pc_time_dt"] = pd.to_datetime(hr_df["pc_time"])
-hr_df["value"] = pd.to_numeric(hr_df["value"], errors="coerce")
-
-rep["pc_time_dt"] = pd.to_datetime(rep["pc_time"])
-
-merged = pd.merge_asof(
-    rep.sort_values("pc_time_dt"),
-    hr_df[["pc_time_dt", "value"]].sort_values("pc_time_dt"),
-    on="pc_time_dt",
-    direction="nearest",
-    tolerance=pd.Timedelta("1s"),
-)
-
-merged.rename(columns={"value": "hr_from_char"}, inplace=True)
-
-# --- 5. Compare the two HR streams (just for sanity check) ---
-
-mask = merged["hr_from_repdat1"].notna() & merged["hr_from_char"].notna()
-merged["hr_diff"] = merged["hr_from_repdat1"] - merged["hr_from_char"]
-
-print("Number of rows with both HRs:", mask.sum())
-if mask.any():
-    print("Mean difference:", merged.loc[mask, "hr_diff"].mean())
-    print(
-        "Min/Max difference:",
-        merged.loc[mask, "hr_diff"].min(),
-        merged.loc[mask, "hr_diff"].max(),
+    merged.rename(columns={"value": "hr_from_char"}, inplace=True)
+    merged["hr_diff"] = merged["hr_from_repdat1"] - merged["hr_from_char"]
+
+    return merged[
+        ["pc_time", "device_ts", "hr_from_repdat1", "hr_from_char", "hr_diff"] + fcols
+    ]
+
+
+# ----------------------------------------------------------------------
+# CHECKPOINTED UPDATE
+# ----------------------------------------------------------------------
+def _load_checkpoint(path: Path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_checkpoint(path: Path, state: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def update_decoded(base: Path = DEFAULT_BASE, full: bool = False) -> pd.DataFrame:
+    """
+    Decode whatever REP_DAT1 rows are new since the last run and append
+    them to DECODED_CSV. Starts over if there is no checkpoint, the source
+    shrank (was rotated/rewritten), the decoded file is missing, or the
+    new rows carry more fields than the existing output has columns.
+    An unterminated last source line is decoded on a full run or once
+    the source stops growing; if it was still being written, the next
+    run cuts its row off DECODED_CSV again and re-reads it.
+    Returns only the newly decoded rows.
+    """
+    base = Path(base)
+    rep_path = base / REP_CSV
+    out_path = base / DECODED_CSV
+    ckpt_path = base / (DECODED_CSV + CHECKPOINT_SUFFIX)
+
+    size = rep_path.stat().st_size
+    ckpt = None if full else _load_checkpoint(ckpt_path)
+    if (
+        ckpt is None
+        or not out_path.exists()
+        or size < ckpt.get("offset", 0)
+    ):
+        ckpt = {"offset": 0, "n_fields": None}
+
+    unchanged = size == ckpt.get("source_size")
+    if ckpt.get("tail_out_size") is not None:
+        if unchanged:
+            return pd.DataFrame()
+        # the last decoded row came from a line that has since grown
+        os.truncate(out_path, ckpt["tail_out_size"])
+
+    appending = ckpt["offset"] > 0
+    rep, new_offset, n_tail = read_new_rows(rep_path, ckpt["offset"],
+                                            include_tail=not appending or unchanged)
+
+    if appending:
+        if rep.empty:
+            _save_checkpoint(ckpt_path, dict(ckpt, source_size=size, tail_out_size=None))
+            return rep
+        width = int(rep["values"].fillna("").astype(str).str.count(",").max()) + 1
+        if width > ckpt["n_fields"]:
+            # Layout grew; existing columns no longer fit -> full rebuild
+            return update_decoded(base, full=True)
+
+    decoded = decode_repdat1(rep, load_hr_char(base / HR_TEMP_CSV), ckpt["n_fields"])
+
+    decoded.iloc[:len(decoded) - n_tail].to_csv(
+        out_path,
+        mode="a" if appending else "w",
+        header=not appending,
+        index=False,
     )
-
-# --- 6. Save a 'decoded-ish' version for further analysis ---
-
-decoded_cols = (
-    ["pc_time", "device_ts", "hr_from_repdat1", "hr_from_char", "hr_diff"]
-    + [f"f{i}" for i in range(1, max_len + 1)]
-)
-
-merged[decoded_cols].to_csv(base / "hera_repdat1_decoded.csv", index=False)
-
-print("\nSaved: hera_repdat1_decoded.csv")
-print("Columns f1..fN are the raw fields from REP_DAT1.")
-print("hr_from_repdat1 is your DSP heart-rate (bpm).")
+    tail_out_size = None
+    if n_tail:
+        tail_out_size = out_path.stat().st_size
+        decoded.iloc[-n_tail:].to_csv(out_path, mode="a", header=False, index=False)
+    n_fields = ckpt["n_fields"] or (decoded.shape[1] - 5)
+    _save_checkpoint(ckpt_path, {"offset": new_offset, "n_fields": n_fields, "source_size": size,
+                                 "tail_out_size": tail_out_size})
+    return decoded
+
+
+def summarize(decoded: pd.DataFrame):
+    """Sanity check: how well REP_DAT1 HR agrees with the HR characteristic."""
+    mask = decoded["hr_from_repdat1"].notna() & decoded["hr_from_char"].notna()
+
+    print("Number of rows with both HRs:", mask.sum())
+    if mask.any():
+        print("Mean difference:", decoded.loc[mask, "hr_diff"].mean())
+        print(
+            "Min/Max difference:",
+            decoded.loc[mask, "hr_diff"].min(),
+            decoded.loc[mask, "hr_diff"].max(),
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode Hera REP_DAT1 logs into f1..fN columns.")
+    parser.add_argument("--base", type=Path, default=DEFAULT_BASE,
+                        help="folder holding hera_repdat1.csv / hera_hr_temp.csv")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the checkpoint and re-decode everything")
+    args = parser.parse_args(argv)
+
+    decoded = update_decoded(args.base, full=args.full)
+    print(f"Decoded {len(decoded)} new REP_DAT1 rows.")
+    if decoded.empty:
+        return
+    summarize(decoded)
+
+    print(f"\nSaved: {DECODED_CSV}")
+    print("Columns f1..fN are the raw fields from REP_DAT1.")
+    print("hr_from_repdat1 is your DSP heart-rate (bpm).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------------------
+# DECODE TABLE
+# ----------------------------------------------------------------------
+# Hera Leto manufacturer payload layout. This is the single source of
+# truth for both the live advertisement_callback and the offline
+# re-decoder below, so a fix here applies to both.
+#
+#   column -> (offset, n_bytes, divisor, sentinel)
+#
+# offset may be negative (counted from the end of the payload), multi-byte
+# fields are little-endian, and a raw value equal to sentinel means
+# "not available" (e.g. SpO2 151 = still reading).
+ADVERT_FIELDS = {
+    "heart_rate_bpm":       (3,   1, 1,   None),
+    "respiration_rate_bpm": (5,   1, 1,   None),
+    "temperature_c":        (10,  2, 100, None),
+    "spo2_pct":             (-5,  1, 1,   151),
+}
+
+# Payloads shorter than this are not decoded at all
+MIN_ADVERT_LEN = 12
+
+
+def decode_advert(raw_data: bytes) -> dict:
+    """
+    Decode one manufacturer payload into {column: value}.
+    Values are None if the payload is too short or a sentinel was hit.
+    """
+    if len(raw_data) < MIN_ADVERT_LEN:
+        return {col: None for col in ADVERT_FIELDS}
+
+    out = {}
+    for col, (offset, n_bytes, divisor, sentinel) in ADVERT_FIELDS.items():
+        start = offset % len(raw_data)
+        raw = int.from_bytes(raw_data[start:start + n_bytes], byteorder="little")
+        if sentinel is not None and raw == sentinel:
+            out[col] = None
+        else:
+            out[col] = raw / divisor if divisor != 1 else raw
+    return out
+
+
+# ----------------------------------------------------------------------
+# VECTORIZED DECODE
+# ----------------------------------------------------------------------
+def hex_to_byte_matrix(hex_strings) -> np.ndarray:
+    """
+    Stack equal-length hex strings into a (rows, n_bytes) uint8 matrix
+    with a single bytes.fromhex call.
+    """
+    hex_strings = list(hex_strings)
+    if not hex_strings:
+        return np.empty((0, 0), dtype=np.uint8)
+    n_bytes = len(hex_strings[0]) // 2
+    buf = bytes.fromhex("".join(hex_strings))
+    return np.frombuffer(buf, dtype=np.uint8).reshape(len(hex_strings), n_bytes)
+
+
+def decode_byte_matrix(mat: np.ndarray) -> dict:
+    """Apply ADVERT_FIELDS to every row of an equal-length byte matrix."""
+    n_rows, n_bytes = mat.shape
+    out = {}
+    for col, (offset, width, divisor, sentinel) in ADVERT_FIELDS.items():
+        if n_bytes < MIN_ADVERT_LEN:
+            out[col] = np.full(n_rows, np.nan)
+            continue
+
+        start = offset % n_bytes
+        raw = np.zeros(n_rows, dtype=np.int64)
+        for k in range(width):
+            raw |= mat[:, start + k].astype(np.int64) << (8 * k)
+
+        vals = raw / divisor
+        if sentinel is not None:
+            vals = np.where(raw == sentinel, np.nan, vals)
+        out[col] = vals
+    return out
+
+
+def decode_raw_hex(raw_hex: pd.Series) -> pd.DataFrame:
+    """
+    Decode a whole raw_hex column. Rows are grouped by payload length so
+    each group becomes one byte matrix; missing/odd hex rows decode to NA.
+    """
+    raw_hex = raw_hex.fillna("").astype(str).str.strip().str.lower()
+    lengths = raw_hex.str.len()
+    valid = (lengths % 2 == 0) & raw_hex.str.fullmatch(r"[0-9a-f]*")
+
+    decoded = pd.DataFrame(
+        {col: np.full(len(raw_hex), np.nan) for col in ADVERT_FIELDS},
+        index=raw_hex.index,
+    )
+    for length, idx in raw_hex[valid].groupby(lengths[valid]).groups.items():
+        if length == 0:
+            continue
+        mat = hex_to_byte_matrix(raw_hex.loc[idx])
+        for col, vals in decode_byte_matrix(mat).items():
+            decoded.loc[idx, col] = vals
+
+    for col, (_, _, divisor, _) in ADVERT_FIELDS.items():
+        if divisor == 1:
+            decoded[col] = decoded[col].astype("Int16")
+    return decoded
+
+
+# ----------------------------------------------------------------------
+# BATCH RE-DECODE
+# ----------------------------------------------------------------------
+def redecode_csv(path, out_path=None) -> int:
+    """
+    Re-decode every advertisement in a hera_advert_metrics-style CSV from
+    its raw_hex column and write the result (default: <name>_redecoded.csv).
+    Returns the number of rows written.
+    """
+    path = Path(path)
+    if out_path is None:
+        out_path = path.with_name(path.stem + "_redecoded.csv")
+
+    df = pd.read_csv(path, dtype={"raw_hex": str})
+    decoded = decode_raw_hex(df["raw_hex"])
+    for col in ADVERT_FIELDS:
+        df[col] = decoded[col]
+    df["temperature_c"] = df["temperature_c"].round(2)
+
+    df.to_csv(out_path, index=False)
+    return len(df)
+
+
+def _redecode_one(args):
+    path, out_dir = args
+    out_path = None
+    if out_dir is not None:
+        out_path = Path(out_dir) / (Path(path).stem + "_redecoded.csv")
+    return str(path), redecode_csv(path, out_path)
+
+
+def redecode_files(paths, out_dir=None, jobs=None):
+    """Re-decode many CSVs in parallel. Yields (path, n_rows) in input order."""
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    work = [(p, out_dir) for p in paths]
+    if jobs == 1 or len(work) <= 1:
+        for item in work:
+            yield _redecode_one(item)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(_redecode_one, work)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-decode Hera advertisement CSVs from their raw_hex column."
+    )
+    parser.add_argument("paths", nargs="+", type=Path,
+                        help="CSV files or folders (folders are searched for hera_advert*.csv)")
+    parser.add_argument("--out-dir", type=Path, default=None,
+                        help="write results here instead of next to each input")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    files = []
+    for p in args.paths:
+        if p.is_dir():
+            files.extend(sorted(p.rglob("hera_advert*.csv")))
+        else:
+            files.append(p)
+    files = [f for f in files if not f.stem.endswith("_redecoded")]
+
+    total = 0
+    for path, n in redecode_files(files, args.out_dir, args.jobs):
+        print(f"{path}: {n} rows")
+        total += n
+    print(f"Re-decoded {total} rows from {len(files)} file(s).")
+
+
+if __name__ == "__main__":
+    main()
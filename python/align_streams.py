@@ -0,0 +1,315 @@
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from csv_cache import TIME_COLUMNS, parse_time_ns
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+CHUNK_ROWS = 200_000
+
+# Every aligned chunk gets this int64 column: ns since Unix epoch, UTC
+UTC_COL = "utc_ns"
+
+# Stream kinds we know how to put on the UTC timeline
+#   hera -> pc_time, PC local wall clock (naive string)
+#   ml2  -> t_ns, device Time.realtimeSinceStartup (resets every app
+#           start), paired with server_time_iso (UTC) on arrival
+KINDS = ("hera", "ml2")
+
+
+# ----------------------------------------------------------------------
+# CLOCK MAPPING
+# ----------------------------------------------------------------------
+def local_zone_name() -> str:
+    """
+    This machine's IANA zone name, from $TZ or the /etc/localtime link.
+    A fixed UTC offset is not enough: recordings that span a DST change
+    would be shifted by an hour on one side of it.
+    """
+    tz = os.environ.get("TZ", "").lstrip(":")
+    if tz and not tz.startswith("/"):
+        return tz
+    link = Path(tz or "/etc/localtime")
+    if link.exists():
+        parts = link.resolve().parts
+        if "zoneinfo" in parts:
+            return "/".join(parts[parts.index("zoneinfo") + 1:])
+    raise ValueError("Cannot tell this machine's timezone; pass tz (e.g. --tz Pacific/Auckland)")
+
+
+def local_wallclock_to_utc_ns(wall_ns: np.ndarray, tz=None) -> np.ndarray:
+    """
+    Convert naive local wall-clock ns (as produced by csv_cache for
+    pc_time) to UTC ns. tz is an IANA name like "Pacific/Auckland";
+    None uses this machine's zone (see local_zone_name).
+    """
+    if tz is None:
+        tz = local_zone_name()
+
+    idx = pd.DatetimeIndex(wall_ns.astype("datetime64[ns]"))
+    utc = idx.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward").tz_convert("UTC")
+    return utc.as_unit("ns").asi8
+
+
+def device_segments(t_ns: np.ndarray, prev_t_ns=None) -> np.ndarray:
+    """
+    Segment id per row, starting at 0 (or 1 if the first row already
+    continues past prev_t_ns with a reset). A new segment starts wherever
+    the device clock goes backwards, i.e. the ML2 app was restarted.
+    """
+    t = np.asarray(t_ns, dtype=np.int64)
+    prev = np.empty_like(t)
+    prev[1:] = t[:-1]
+    prev[:1] = t[:1] if prev_t_ns is None else prev_t_ns
+    return np.cumsum(t < prev)
+
+
+def estimate_device_offsets(path, chunksize: int = CHUNK_ROWS) -> list:
+    """
+    One streaming pass over an ML2 CSV: for every device-clock segment,
+    the UTC offset is min(server_time - t_ns). Network and queueing delay
+    only ever add to that difference, so the minimum is the best bound
+    on the true offset. Memory is O(segments).
+    """
+    offsets = []
+    prev_t = None
+    for chunk in pd.read_csv(path, usecols=["t_ns", "server_time_iso"], chunksize=chunksize):
+        t = chunk["t_ns"].to_numpy(dtype=np.int64)
+        server = parse_time_ns(chunk["server_time_iso"], TIME_COLUMNS["server_time_iso"])
+        seg = device_segments(t, prev_t) + max(len(offsets) - 1, 0)
+
+        diff = server - t
+        for s in np.unique(seg):
+            m = diff[seg == s].min()
+            if s < len(offsets):
+                offsets[s] = min(offsets[s], int(m))
+            else:
+                offsets.append(int(m))
+        prev_t = int(t[-1])
+    return offsets
+
+
+def iter_aligned(path, kind: str, chunksize: int = CHUNK_ROWS, tz=None,
+                 clock_offset_ns: int = 0, device_offsets=None):
+    """
+    Read a recording CSV chunk by chunk and yield DataFrames with an added
+    UTC_COL, sorted within each chunk. clock_offset_ns is added on top
+    (e.g. a known skew between the Hera PC and the ML2 server clock).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown stream kind '{kind}', expected one of {KINDS}")
+
+    if kind == "ml2" and device_offsets is None:
+        device_offsets = estimate_device_offsets(path, chunksize)
+
+    seg_base = 0
+    prev_t = None
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if kind == "hera":
+            wall = parse_time_ns(chunk["pc_time"], TIME_COLUMNS["pc_time"])
+            utc = local_wallclock_to_utc_ns(wall, tz)
+        else:
+            t = chunk["t_ns"].to_numpy(dtype=np.int64)
+            seg = device_segments(t, prev_t) + seg_base
+            utc = t + np.asarray(device_offsets, dtype=np.int64)[seg]
+            seg_base = int(seg[-1])
+            prev_t = int(t[-1])
+
+        # unparseable or ambiguous times come back as NaT; drop them
+        # before the offset moves them off the sentinel
+        ok = utc != np.iinfo(np.int64).min
+        chunk[UTC_COL] = utc + clock_offset_ns
+        chunk = chunk[ok]
+        yield chunk.sort_values(UTC_COL, kind="stable")
+
+
+# ----------------------------------------------------------------------
+# JOINS
+# ----------------------------------------------------------------------
+def _asof_index(left_ts, right_ts, direction: str, tolerance_ns: int) -> np.ndarray:
+    """Row in right_ts matched to each left_ts, or -1 for no match."""
+    n = len(right_ts)
+    if n == 0:
+        return np.full(len(left_ts), -1)
+
+    back = np.searchsorted(right_ts, left_ts, side="right") - 1
+    fwd = np.searchsorted(right_ts, left_ts, side="left")
+
+    back_ok = back >= 0
+    fwd_ok = fwd < n
+    back_dt = np.where(back_ok, left_ts - right_ts[np.clip(back, 0, n - 1)], np.iinfo(np.int64).max)
+    fwd_dt = np.where(fwd_ok, right_ts[np.clip(fwd, 0, n - 1)] - left_ts, np.iinfo(np.int64).max)
+
+    if direction == "backward":
+        idx, dt = back, back_dt
+    elif direction == "forward":
+        idx, dt = fwd, fwd_dt
+    elif direction == "nearest":
+        use_fwd = fwd_dt < back_dt
+        idx = np.where(use_fwd, fwd, back)
+        dt = np.where(use_fwd, fwd_dt, back_dt)
+    else:
+        raise ValueError(f"Unknown direction '{direction}'")
+
+    return np.where(dt <= tolerance_ns, idx, -1)
+
+
+def _window_mean(left_ts, right_ts, values: np.ndarray, window_ns: int):
+    """
+    Mean and count of right values within +-window_ns of each left
+    timestamp, via prefix sums (NaNs are skipped).
+    """
+    lo = np.searchsorted(right_ts, left_ts - window_ns, side="left")
+    hi = np.searchsorted(right_ts, left_ts + window_ns, side="right")
+
+    finite = np.isfinite(values)
+    csum = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(np.where(finite, values, 0.0), axis=0)])
+    ccnt = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(finite, axis=0)])
+
+    total = csum[hi] - csum[lo]
+    count = ccnt[hi] - ccnt[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+    return mean, count
+
+
+def join_chunks(left_chunks, right_chunks, right_cols, tolerance_ns: int = 1_000_000_000,
+                direction: str = "backward", window_ns=None, prefix: str = "right_"):
+    """
+    Sorted streaming join of two aligned chunk iterators (see iter_aligned).
+
+    window_ns=None: as-of join, each left row gets the matching right row
+                    (direction backward/forward/nearest, within tolerance_ns).
+    window_ns=W:    windowed join, each left row gets the mean and count of
+                    right_cols over right rows within +-W.
+
+    Only right rows that can still match upcoming left rows are buffered,
+    so memory is bounded by one left chunk plus the right rows inside the
+    join reach, independent of total recording length.
+    """
+    reach = max(tolerance_ns, window_ns or 0)
+    right_cols = list(right_cols)
+    right_iter = iter(right_chunks)
+    buf = None
+    right_done = False
+
+    for left in left_chunks:
+        if left.empty:
+            continue
+        lts = left[UTC_COL].to_numpy(dtype=np.int64)
+        hi = int(lts[-1])
+
+        # Pull right chunks until they cover this left chunk's reach
+        parts = [] if buf is None else [buf]
+        last = int(buf[UTC_COL].iloc[-1]) if buf is not None and len(buf) else None
+        while not right_done and (last is None or last <= hi + reach):
+            try:
+                nxt = next(right_iter)
+            except StopIteration:
+                right_done = True
+                break
+            if nxt.empty:
+                continue
+            parts.append(nxt[[UTC_COL] + right_cols])
+            last = int(nxt[UTC_COL].iloc[-1])
+        if parts:
+            buf = pd.concat(parts, ignore_index=True)
+
+        out = left.reset_index(drop=True)
+        rts = (
+            buf[UTC_COL].to_numpy(dtype=np.int64)
+            if buf is not None else np.empty(0, dtype=np.int64)
+        )
+
+        if window_ns is None:
+            idx = _asof_index(lts, rts, direction, tolerance_ns)
+            hit = pd.Series(idx >= 0)
+            if len(rts):
+                matched = buf.iloc[np.where(hit, idx, 0)].reset_index(drop=True)
+                for col in [UTC_COL] + right_cols:
+                    out[prefix + col] = matched[col].where(hit)
+            else:
+                for col in [UTC_COL] + right_cols:
+                    out[prefix + col] = np.nan
+        else:
+            if len(rts):
+                vals = buf[right_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+            else:
+                vals = np.empty((0, len(right_cols)))
+            mean, count = _window_mean(lts, rts, vals, window_ns)
+            for j, col in enumerate(right_cols):
+                out[prefix + col] = mean[:, j]
+                out[prefix + col + "_n"] = count[:, j].astype(np.int64)
+
+        yield out
+
+        # Drop right rows that no later left row can reach
+        if buf is not None and len(buf):
+            buf = buf[rts >= hi - reach].reset_index(drop=True)
+
+
+def join_files(left_path, left_kind, right_path, right_kind, right_cols, out_path,
+               chunksize: int = CHUNK_ROWS, tz=None, left_offset_ns: int = 0,
+               right_offset_ns: int = 0, **join_kwargs) -> int:
+    """
+    Align two recordings onto UTC and stream their join into out_path.
+    Returns the number of rows written.
+    """
+    left = iter_aligned(left_path, left_kind, chunksize, tz, left_offset_ns)
+    right = iter_aligned(right_path, right_kind, chunksize, tz, right_offset_ns)
+
+    tmp = Path(str(out_path) + ".tmp")
+    n = 0
+    first = True
+    for out in join_chunks(left, right, right_cols, **join_kwargs):
+        out.to_csv(tmp, mode="w" if first else "a", header=first, index=False)
+        first = False
+        n += len(out)
+    if first:
+        return 0
+    os.replace(tmp, out_path)
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time-align two recordings onto UTC ns and join them chunk by chunk."
+    )
+    parser.add_argument("left", type=Path, help="e.g. ML2 imu.csv")
+    parser.add_argument("right", type=Path, help="e.g. hera_advert_metrics.csv")
+    parser.add_argument("--left-kind", choices=KINDS, default="ml2")
+    parser.add_argument("--right-kind", choices=KINDS, default="hera")
+    parser.add_argument("--cols", nargs="+", required=True, help="right-hand columns to attach")
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--tz", default=None, help="IANA timezone of Hera pc_time (default: this machine's)")
+    parser.add_argument("--left-offset-ms", type=float, default=0.0, help="extra clock correction for left")
+    parser.add_argument("--right-offset-ms", type=float, default=0.0, help="extra clock correction for right")
+    parser.add_argument("--direction", choices=("backward", "forward", "nearest"), default="backward")
+    parser.add_argument("--tolerance-ms", type=float, default=1000.0)
+    parser.add_argument("--window-ms", type=float, default=None,
+                        help="windowed mean join of +-W ms instead of as-of")
+    parser.add_argument("--prefix", default="right_")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    n = join_files(
+        args.left, args.left_kind, args.right, args.right_kind, args.cols, args.out,
+        chunksize=args.chunksize,
+        tz=args.tz,
+        left_offset_ns=int(args.left_offset_ms * 1e6),
+        right_offset_ns=int(args.right_offset_ms * 1e6),
+        tolerance_ns=int(args.tolerance_ms * 1e6),
+        direction=args.direction,
+        window_ns=None if args.window_ms is None else int(args.window_ms * 1e6),
+        prefix=args.prefix,
+    )
+    print(f"Wrote {n} joined rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
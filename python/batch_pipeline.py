@@ -0,0 +1,467 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Hera decoders live in ../HeraLeto
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "HeraLeto"))
+from analyze_hera_repdat1 import HR_TEMP_CSV, REP_CSV, decode_repdat1, load_hr_char, read_new_rows  # noqa: E402
+from hera_advert_decode import ADVERT_FIELDS, decode_raw_hex  # noqa: E402
+
+from align_streams import device_segments, join_files  # noqa: E402
+from export_dataset import export_windows  # noqa: E402
+from recorder_session import FRAMES_FILE, FRAMES_INDEX, SENSOR_TYPES, load_imu, pack_session  # noqa: E402
+from stream_health import StreamMonitor, monitor_csv  # noqa: E402
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+CHUNK_ROWS = 200_000
+MANIFEST_DIR = ".stages"      # per-session stage manifests, inside the output folder
+
+ML2_IMU = "imu.csv"
+ML2_HEADPOSE = "headpose.csv"
+HERA_ADVERT = "hera_advert_metrics.csv"
+HERA_SPO2 = "hera_spo2.csv"
+HERA_FILES = (REP_CSV, HR_TEMP_CSV, HERA_ADVERT, HERA_SPO2)
+
+IMU_CHANNELS = ["accx", "accy", "accz", "gyrox", "gyroy", "gyroz", "magx", "magy", "magz"]
+POSE_CHANNELS = ["px", "py", "pz", "qx", "qy", "qz", "qw"]
+
+# Session kinds:
+#   ml2       server.py output: imu.csv + headpose.csv (t_ns, server_time_iso)
+#   recorder  ML2NativeRecorder folder: imu.csv (mono_ns, ...) + cam/ and/or an in-place pack
+#   hera      HLTO_Readings_* output: hera_*.csv
+Session = namedtuple("Session", ["id", "kind", "dir", "sources"])
+
+
+# ----------------------------------------------------------------------
+# DISCOVERY
+# ----------------------------------------------------------------------
+def _csv_header(path: Path) -> list:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.readline().strip().split(",")
+
+
+def classify_dir(d: Path):
+    """(kind, source files) for a session folder, or None if it isn't one."""
+    names = set(os.listdir(d))
+    if ML2_IMU in names:
+        header = _csv_header(d / ML2_IMU)
+        if "mono_ns" in header:
+            # A session already packed in place (recorder_session.py,
+            # maybe with --remove-loose) is identified by its pack too
+            sources = [d / ML2_IMU]
+            for extra in ("cam", FRAMES_FILE, FRAMES_INDEX):
+                if (d / extra).exists():
+                    sources.append(d / extra)
+            return "recorder", sources
+        if "t_ns" in header and ML2_HEADPOSE in names:
+            return "ml2", [d / ML2_IMU, d / ML2_HEADPOSE]
+    hera = [d / n for n in HERA_FILES if n in names]
+    if (d / REP_CSV) in hera or (d / HERA_ADVERT) in hera:
+        return "hera", hera
+    return None
+
+
+def discover_sessions(roots) -> list:
+    """Every session folder under roots, in a stable order."""
+    sessions = []
+    for root in map(Path, roots):
+        for d, dirs, _ in os.walk(root):
+            dirs[:] = sorted(x for x in dirs if not x.startswith((".", "__")) and x != "cam")
+            found = classify_dir(Path(d))
+            if found is None:
+                continue
+            kind, sources = found
+            rel = Path(d).resolve().relative_to(root.resolve())
+            sid = "/".join((root.resolve().name,) + rel.parts)
+            sessions.append(Session(sid, kind, str(Path(d).resolve()), [str(s) for s in sources]))
+    return sessions
+
+
+# ----------------------------------------------------------------------
+# FINGERPRINTS
+# ----------------------------------------------------------------------
+def _path_stat(path: Path):
+    """(size, mtime_ns) of a file; for a folder, totals over its files."""
+    if path.is_dir():
+        size, mtime, n = 0, 0, 0
+        with os.scandir(path) as it:
+            for e in it:
+                if e.is_file():
+                    st = e.stat()
+                    size, mtime, n = size + st.st_size, max(mtime, st.st_mtime_ns), n + 1
+        return [n, size, mtime]
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def source_fingerprint(session: Session) -> str:
+    """Same idea as csv_cache: sources are unchanged if size + mtime are."""
+    h = hashlib.sha1(session.kind.encode())
+    for s in session.sources:
+        h.update(json.dumps([Path(s).name, _path_stat(Path(s))]).encode())
+    return h.hexdigest()
+
+
+def stage_fingerprint(prev: str, stage: "Stage", params: dict) -> str:
+    """Chained: a stage reruns when its sources, params or any earlier stage change."""
+    blob = json.dumps([prev, stage.name, stage.version, params], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+def source_bytes(session: Session) -> int:
+    total = 0
+    for s in session.sources:
+        st = _path_stat(Path(s))
+        total += st[1] if Path(s).is_dir() else st[0]
+    return total
+
+
+# ----------------------------------------------------------------------
+# HELPERS
+# ----------------------------------------------------------------------
+def _filter_csv(src, dst, keep, chunksize: int = CHUNK_ROWS) -> int:
+    """
+    Stream src through keep(chunk, carry) -> (mask, carry) into dst.
+    carry lets the filter look back across chunk boundaries.
+    """
+    tmp = Path(str(dst) + ".tmp")
+    n, first, carry = 0, True, None
+    for chunk in pd.read_csv(src, chunksize=chunksize):
+        mask, carry = keep(chunk, carry)
+        out = chunk[mask]
+        out.to_csv(tmp, mode="w" if first else "a", header=first, index=False)
+        first = False
+        n += len(out)
+    if first:
+        pd.read_csv(src, nrows=0).to_csv(tmp, index=False)
+    os.replace(tmp, dst)
+    return n
+
+
+def _drop_repeated_t(chunk, prev_t):
+    """Keep rows whose t_ns differs from the row before (repeated packets)."""
+    t = chunk["t_ns"].to_numpy(dtype=np.int64)
+    prev = np.empty_like(t)
+    prev[1:] = t[:-1]
+    if len(t):
+        prev[0] = t[0] - 1 if prev_t is None else prev_t
+    return t != prev, (int(t[-1]) if len(t) else prev_t)
+
+
+def _need(path: Path, stage: str) -> Path:
+    if not path.exists():
+        raise FileNotFoundError(f"{path.name} missing; run the '{stage}' stage first")
+    return path
+
+
+# ----------------------------------------------------------------------
+# STAGES
+# ----------------------------------------------------------------------
+# Each stage is fn(session, out_dir, params) -> dict with "outputs"
+# (paths the stage produced, checked on reruns) and optional "rows".
+
+def stage_decode(session: Session, out: Path, params: dict) -> dict:
+    src = Path(session.dir)
+    if session.kind == "recorder":
+        # Sources are only ever read: the pack goes under --out, and
+        # deleting loose frames is left to recorder_session.py
+        if params.get("remove_loose"):
+            raise ValueError("decode does not delete source frames; "
+                             "use recorder_session.py --remove-loose on packed sessions")
+        if (src / FRAMES_INDEX).exists() and not any((src / "cam").glob("frame_*.bin")):
+            with np.load(src / FRAMES_INDEX) as npz:
+                n = len(npz["frame_idx"])
+            return {"outputs": [src / FRAMES_FILE, src / FRAMES_INDEX], "rows": n}
+        n = pack_session(src, out_dir=out / "packed")
+        return {"outputs": [out / "packed" / FRAMES_FILE, out / "packed" / FRAMES_INDEX], "rows": n}
+
+    # hera
+    outputs, rows = [], 0
+    if (src / REP_CSV).exists():
+        rep, _, _ = read_new_rows(src / REP_CSV, 0, include_tail=True)
+        hr = load_hr_char(src / HR_TEMP_CSV, cache=False) if (src / HR_TEMP_CSV).exists() else \
+            pd.DataFrame({"pc_time_ns": np.empty(0, dtype=np.int64), "value": np.empty(0)})
+        decoded = decode_repdat1(rep, hr)
+        decoded.to_csv(out / "repdat1_decoded.csv", index=False)
+        outputs.append(out / "repdat1_decoded.csv")
+        rows += len(decoded)
+    if (src / HERA_ADVERT).exists():
+        adv = pd.read_csv(src / HERA_ADVERT, dtype={"raw_hex": str})
+        vitals = decode_raw_hex(adv["raw_hex"])
+        for col in ADVERT_FIELDS:
+            adv[col] = vitals[col]
+        adv["temperature_c"] = adv["temperature_c"].round(2)
+        adv.to_csv(out / "adverts_decoded.csv", index=False)
+        outputs.append(out / "adverts_decoded.csv")
+        rows += len(adv)
+    return {"outputs": outputs, "rows": rows}
+
+
+def stage_clean(session: Session, out: Path, params: dict) -> dict:
+    chunksize = params.get("chunksize", CHUNK_ROWS)
+    if session.kind == "ml2":
+        src = Path(session.dir)
+
+        def keep_imu(chunk, prev_t):
+            fresh, prev_t = _drop_repeated_t(chunk, prev_t)
+            zero = (chunk[IMU_CHANNELS] == 0).all(axis=1).to_numpy()
+            return fresh & ~zero, prev_t
+
+        n = _filter_csv(src / ML2_IMU, out / "imu_clean.csv", keep_imu, chunksize)
+        n += _filter_csv(src / ML2_HEADPOSE, out / "headpose_clean.csv", _drop_repeated_t, chunksize)
+        return {"outputs": [out / "imu_clean.csv", out / "headpose_clean.csv"], "rows": n}
+
+    # hera: the same advert is often picked up several times in a row
+    def keep_new_advert(chunk, prev_hex):
+        hexes = chunk["raw_hex"].astype(str).to_numpy()
+        prev = np.empty_like(hexes)
+        prev[1:] = hexes[:-1]
+        if len(hexes):
+            prev[0] = "" if prev_hex is None else prev_hex
+        return hexes != prev, (hexes[-1] if len(hexes) else prev_hex)
+
+    # a session with only REP_DAT1 records has nothing to clean
+    if not (Path(session.dir) / HERA_ADVERT).exists():
+        return {"outputs": [], "rows": 0}
+    adv = _need(out / "adverts_decoded.csv", "decode")
+    n = _filter_csv(adv, out / "adverts_clean.csv", keep_new_advert, chunksize)
+    return {"outputs": [out / "adverts_clean.csv"], "rows": n}
+
+
+def stage_align(session: Session, out: Path, params: dict) -> dict:
+    if session.kind == "ml2":
+        n = join_files(
+            _need(out / "imu_clean.csv", "clean"), "ml2",
+            _need(out / "headpose_clean.csv", "clean"), "ml2",
+            POSE_CHANNELS, out / "imu_headpose.csv",
+            tolerance_ns=int(params.get("tolerance_ms", 20) * 1e6),
+            direction=params.get("direction", "nearest"),
+        )
+        return {"outputs": [out / "imu_headpose.csv"], "rows": n}
+
+    # hera: every REP_DAT1 record with the latest advert vitals before it;
+    # sessions that recorded only one of the two have nothing to join
+    src = Path(session.dir)
+    if not ((src / REP_CSV).exists() and (src / HERA_ADVERT).exists()):
+        return {"outputs": [], "rows": 0}
+    n = join_files(
+        _need(out / "repdat1_decoded.csv", "decode"), "hera",
+        _need(out / "adverts_clean.csv", "clean"), "hera",
+        list(ADVERT_FIELDS), out / "repdat1_vitals.csv",
+        tz=params.get("tz"),
+        tolerance_ns=int(params.get("tolerance_ms", 5000) * 1e6),
+        direction="backward",
+    )
+    return {"outputs": [out / "repdat1_vitals.csv"], "rows": n}
+
+
+def stage_summarize(session: Session, out: Path, params: dict) -> dict:
+    summary = {"session": session.id, "kind": session.kind, "streams": {}}
+    quiet = lambda name, msg: None  # noqa: E731
+
+    if session.kind == "recorder":
+        imu = load_imu(session.dir)
+        for sensor_type, part in imu.groupby("type"):
+            name = SENSOR_TYPES.get(int(sensor_type), f"type_{sensor_type}")
+            mon = StreamMonitor(name, report=False, on_alert=quiet)
+            mon.update_many(part["mono_ns"].to_numpy(dtype=np.int64))
+            summary["streams"][name] = mon.summary()
+    else:
+        files = {
+            "ml2": [(ML2_IMU, "imu"), (ML2_HEADPOSE, "headpose")],
+            "hera": [(REP_CSV, "hera_repdat1"), (HR_TEMP_CSV, "hera_hr_temp"), (HERA_ADVERT, "hera_advert")],
+        }[session.kind]
+        for name, kind in files:
+            path = Path(session.dir) / name
+            if path.exists():
+                summary["streams"][kind] = monitor_csv(path, kind, on_alert=quiet).summary()
+
+    if session.kind == "ml2":
+        t = pd.read_csv(Path(session.dir) / ML2_IMU, usecols=["t_ns"])["t_ns"].to_numpy(dtype=np.int64)
+        summary["app_sessions"] = int(device_segments(t)[-1]) + 1 if len(t) else 0
+
+    with open(out / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=float)
+    return {"outputs": [out / "summary.json"], "rows": sum(s["samples"] for s in summary["streams"].values())}
+
+
+def stage_export(session: Session, out: Path, params: dict) -> dict:
+    n = export_windows(
+        _need(out / "imu_clean.csv", "clean"),
+        _need(out / "headpose_clean.csv", "clean"),
+        out / "windows", **params,
+    )
+    return {"outputs": [out / "windows" / "meta.json"], "rows": n}
+
+
+Stage = namedtuple("Stage", ["name", "fn", "kinds", "version"])
+
+# Bump a stage's version when its output format or logic changes so
+# cached results are recomputed
+STAGES = {s.name: s for s in (
+    Stage("decode", stage_decode, ("hera", "recorder"), 1),
+    Stage("clean", stage_clean, ("ml2", "hera"), 1),
+    Stage("align", stage_align, ("ml2", "hera"), 1),
+    Stage("summarize", stage_summarize, ("ml2", "hera", "recorder"), 1),
+    Stage("export", stage_export, ("ml2",), 1),
+)}
+DEFAULT_CHAIN = tuple(STAGES)
+
+
+# ----------------------------------------------------------------------
+# RUNNER
+# ----------------------------------------------------------------------
+def _manifest_path(out: Path, stage: str) -> Path:
+    return out / MANIFEST_DIR / f"{stage}.json"
+
+
+def run_session(session: Session, chain, out_root, config: dict = None, force: bool = False) -> list:
+    """
+    Run the stage chain for one session. A stage is skipped when its
+    manifest holds the same fingerprint and all its outputs still exist;
+    manifests are written only after a stage succeeds, so an interrupted
+    batch resumes at the first unfinished stage. The first failing stage
+    stops the chain. A stage that leaves new files in the session's
+    source folder fails. Returns one result dict per stage.
+    """
+    config = config or {}
+    out = Path(out_root) / session.id
+    (out / MANIFEST_DIR).mkdir(parents=True, exist_ok=True)
+
+    fp = source_fingerprint(session)
+    results = []
+    for name in chain:
+        stage = STAGES[name]
+        if session.kind not in stage.kinds:
+            continue
+        params = config.get(name, {})
+        fp = stage_fingerprint(fp, stage, params)
+        res = {"session": session.id, "stage": name, "seconds": 0.0, "rows": 0}
+
+        mpath = _manifest_path(out, name)
+        if not force and mpath.exists():
+            with open(mpath, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["fingerprint"] == fp and all(Path(p).exists() for p in manifest["outputs"]):
+                results.append(dict(res, status="cached", rows=manifest.get("rows", 0)))
+                continue
+
+        t0 = time.perf_counter()
+        try:
+            before = set(os.listdir(session.dir))
+            info = stage.fn(session, out, params)
+            added = set(os.listdir(session.dir)) - before
+            if added:
+                raise RuntimeError(f"stage wrote into the source folder: {', '.join(sorted(added))}")
+        except Exception as e:
+            results.append(dict(res, status="failed", seconds=time.perf_counter() - t0,
+                                error=f"{type(e).__name__}: {e}",
+                                traceback=traceback.format_exc()))
+            break
+        elapsed = time.perf_counter() - t0
+
+        manifest = {"fingerprint": fp, "outputs": [str(p) for p in info["outputs"]],
+                    "rows": int(info.get("rows", 0)), "seconds": elapsed, "params": params}
+        tmp = mpath.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(tmp, mpath)
+        results.append(dict(res, status="ran", seconds=elapsed, rows=manifest["rows"]))
+    return results
+
+
+def run_batch(sessions, chain=DEFAULT_CHAIN, out_root="batch_out", config: dict = None,
+              jobs: int = None, force: bool = False) -> list:
+    """
+    Run the chain over every session in a process pool (one session per
+    task, its stages in order) and print a per-stage timing report.
+    """
+    unknown = [s for s in chain if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {unknown}; available: {list(STAGES)}")
+
+    t0 = time.perf_counter()
+    results = []
+    in_bytes = 0
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = {pool.submit(run_session, s, list(chain), out_root, config, force): s
+                   for s in sessions}
+        for n, fut in enumerate(as_completed(futures), start=1):
+            session = futures[fut]
+            in_bytes += source_bytes(session)
+            res = fut.result()
+            results += res
+            states = " ".join(f"{r['stage']}:{r['status']}" for r in res)
+            print(f"[batch] {n}/{len(sessions)} {session.id} ({session.kind}) {states}")
+            for r in res:
+                if r["status"] == "failed":
+                    print(f"[batch]   {r['stage']} failed: {r['error']}")
+    wall = time.perf_counter() - t0
+
+    print_report(results, len(sessions), in_bytes, wall)
+    return results
+
+
+def print_report(results, n_sessions: int, in_bytes: int, wall_s: float):
+    df = pd.DataFrame(results, columns=["session", "stage", "status", "seconds", "rows"])
+    print("\nstage        ran cached failed   cpu s   mean s     rows/s")
+    for name in STAGES:
+        part = df[df["stage"] == name]
+        if part.empty:
+            continue
+        ran = part[part["status"] == "ran"]
+        secs = ran["seconds"].sum()
+        print(f"{name:<11} {len(ran):>4} {(part['status'] == 'cached').sum():>6} "
+              f"{(part['status'] == 'failed').sum():>6} {secs:>7.2f} "
+              f"{(secs / len(ran)) if len(ran) else 0:>8.3f} "
+              f"{(ran['rows'].sum() / secs) if secs else 0:>10.0f}")
+    print(f"\n{n_sessions} sessions, {in_bytes / 1e6:.1f} MB of sources in {wall_s:.2f}s "
+          f"({n_sessions / wall_s if wall_s else 0:.2f} sessions/s, "
+          f"{in_bytes / 1e6 / wall_s if wall_s else 0:.1f} MB/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Discover ML2 / recorder / Hera sessions and run a cached stage chain over them."
+    )
+    parser.add_argument("roots", nargs="+", help="folders to search for sessions")
+    parser.add_argument("--out", default="batch_out", help="output root (one folder per session)")
+    parser.add_argument("--stages", default=",".join(DEFAULT_CHAIN),
+                        help=f"comma-separated chain, from: {','.join(STAGES)}")
+    parser.add_argument("--config", default=None,
+                        help='JSON file of per-stage params, e.g. {"export": {"rate_hz": 100}}')
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPUs)")
+    parser.add_argument("--force", action="store_true", help="ignore cached stage results")
+    parser.add_argument("--list", action="store_true", help="only list discovered sessions")
+    args = parser.parse_args(argv)
+
+    sessions = discover_sessions(args.roots)
+    if args.list or not sessions:
+        for s in sessions:
+            print(f"{s.kind:<9} {s.id}")
+        print(f"{len(sessions)} session(s)")
+        return
+
+    config = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+    chain = [s.strip() for s in args.stages.split(",") if s.strip()]
+    run_batch(sessions, chain, args.out, config, args.jobs, args.force)
+
+
+if __name__ == "__main__":
+    main()
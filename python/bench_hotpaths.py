@@ -0,0 +1,375 @@
+import argparse
+import contextlib
+import csv
+import json
+import platform
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+
+# Hera collectors / decoders live in ../HeraLeto
+SCRIPT_DIR = Path(__file__).resolve().parent
+HERA_DIR = SCRIPT_DIR.parent / "HeraLeto"
+sys.path.insert(0, str(HERA_DIR))
+
+import server  # noqa: E402
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+ML2_DIR = SCRIPT_DIR / "ML2_readings"
+BASELINE_FILE = SCRIPT_DIR / "bench_baseline.json"
+
+MIN_TIME_S = 0.2          # each timing run lasts at least this long
+REPEAT = 5                # best of REPEAT runs
+ALLOC_CALLS = 200         # calls traced with tracemalloc for the allocation figures
+THRESHOLD = 0.15          # >15% slower, or >15% more bytes per call, is a regression
+ALLOC_SLACK_B = 256       # ...but ignore allocation changes smaller than this
+
+# Timings can shift by more than THRESHOLD between processes on shared or
+# frequency-scaled CPUs even when the spread within a run is small;
+# save and compare baselines on the same idle machine, or raise --threshold.
+
+TCP_SEGMENT = 7           # recv() size for the fragmented read_exact case
+
+Bench = namedtuple("Bench", ["name", "setup", "doc"])
+
+
+# ----------------------------------------------------------------------
+# FIXTURES
+# ----------------------------------------------------------------------
+class _NullFile:
+    """Write sink for csv writers / stdout: formats everything, keeps nothing."""
+
+    def write(self, s):
+        return len(s)
+
+    def flush(self):
+        pass
+
+
+class _BytesConn:
+    """
+    In-memory stand-in for the client socket: recv() serves a byte
+    stream, at most max_recv bytes at a time. loop=True wraps around at
+    the end; otherwise an empty recv() signals a closed connection.
+    """
+
+    def __init__(self, data: bytes, max_recv: int = None, loop: bool = True):
+        self.data = memoryview(data)
+        self.pos = 0
+        self.max_recv = max_recv
+        self.loop = loop
+
+    def recv(self, n: int) -> bytes:
+        if self.pos >= len(self.data):
+            if not self.loop:
+                return b""
+            self.pos = 0
+        if self.max_recv:
+            n = min(n, self.max_recv)
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += len(chunk)
+        return bytes(chunk)
+
+    def close(self):
+        pass
+
+
+def ml2_packets() -> list:
+    """Wire-format packets (header + payload) rebuilt from imu.csv and headpose.csv, in t_ns order."""
+    imu = pd.read_csv(ML2_DIR / "imu.csv")
+    pose = pd.read_csv(ML2_DIR / "headpose.csv")
+    packets = []
+    for row in imu.itertuples(index=False):
+        payload = server.IMU_STRUCT.pack(row.accx, row.accy, row.accz, row.gyrox, row.gyroy,
+                                         row.gyroz, row.magx, row.magy, row.magz)
+        packets.append((row.t_ns, server.HEADER_STRUCT.pack(
+            server.TYPE_IMU, row.sensorId, 0, row.t_ns, len(payload)) + payload))
+    for row in pose.itertuples(index=False):
+        payload = server.HEADPOSE_STRUCT.pack(row.px, row.py, row.pz, row.qx, row.qy, row.qz, row.qw)
+        packets.append((row.t_ns, server.HEADER_STRUCT.pack(
+            server.TYPE_HEADPOSE, row.sensorId, 0, row.t_ns, len(payload)) + payload))
+    packets.sort(key=lambda p: p[0])
+    return [p for _, p in packets]
+
+
+def _cycle(items):
+    """Zero-arg callable returning the next item, round-robin."""
+    state = {"i": 0}
+    n = len(items)
+
+    def nxt():
+        i = state["i"]
+        state["i"] = i + 1 if i + 1 < n else 0
+        return items[i]
+    return nxt
+
+
+# ----------------------------------------------------------------------
+# BENCHMARKS
+# ----------------------------------------------------------------------
+# Each setup(stack) returns (fn, items_per_call); fn() is one timed call.
+# Files, temp folders and patched globals are registered on the ExitStack
+# and released once the benchmark is done.
+
+def _temp_out_dir(stack: contextlib.ExitStack):
+    """Point server.OUT_DIR at a temporary folder for one benchmark."""
+    stack.callback(setattr, server, "OUT_DIR", server.OUT_DIR)
+    server.OUT_DIR = stack.enter_context(tempfile.TemporaryDirectory(prefix="bench_ml2_"))
+
+
+def setup_read_exact(max_recv=None):
+    def setup(stack):
+        imu_packets = [p for p in ml2_packets() if p[0] == server.TYPE_IMU]
+        conn = _BytesConn(b"".join(imu_packets), max_recv=max_recv)
+        size = len(imu_packets[0])
+        return (lambda: server.read_exact(conn, size)), 1
+    return setup
+
+
+def setup_decode(stack):
+    packets = [p for p in ml2_packets() if p[0] == server.TYPE_IMU]
+    nxt = _cycle(packets)
+    header_size = server.HEADER_SIZE
+
+    def fn():
+        pkt = nxt()
+        server.parse_header(pkt[:header_size])
+        return server.IMU_STRUCT.unpack(pkt[header_size:])
+    return fn, 1
+
+
+def setup_csv_row(stack):
+    """server.py's per-sample CSV path: ISO timestamp, writerow, flush."""
+    _temp_out_dir(stack)
+    f, w = server.open_imu_csv()
+    stack.enter_context(f)
+    values = server.IMU_STRUCT.unpack(
+        [p for p in ml2_packets() if p[0] == server.TYPE_IMU][1][server.HEADER_SIZE:])
+
+    def fn():
+        iso = server.datetime.now(server.timezone.utc).isoformat()
+        w.writerow([123456789, server.TYPE_IMU, 0, *values, iso])
+        f.flush()
+    return fn, 1
+
+
+def setup_handle_client(stack):
+    """Whole ingest loop (read, decode, health, rollups, CSV) over the recording."""
+    _temp_out_dir(stack)
+    packets = ml2_packets()
+    stream = b"".join(packets)
+    sink = _NullFile()
+
+    def fn():
+        with contextlib.redirect_stdout(sink):
+            server.handle_client(_BytesConn(stream, loop=False), ("bench", 0))
+    return fn, len(packets)
+
+
+def setup_advertisement_callback(stack):
+    import HLTO_Readings_Final_ios as collector
+
+    adverts = pd.read_csv(HERA_DIR / "hera_advert_metrics.csv", dtype={"raw_hex": str})
+    device = SimpleNamespace(name="HLTO - 01CC", address=adverts["device_address"].iat[0])
+    events = [
+        SimpleNamespace(rssi=int(r.rssi_dbm), manufacturer_data={int(r.manufacturer_id): bytes.fromhex(r.raw_hex)})
+        for r in adverts.itertuples(index=False)
+    ]
+    nxt = _cycle(events)
+    sink = _NullFile()
+    stack.callback(setattr, collector, "csv_writer", collector.csv_writer)
+    collector.csv_writer = csv.writer(sink)
+
+    def fn():
+        with contextlib.redirect_stdout(sink):
+            collector.advertisement_callback(device, nxt())
+    return fn, 1
+
+
+def setup_decode_values(stack):
+    # decode_values replaced split_to_numbers for REP_DAT1 parsing
+    from analyze_hera_repdat1 import decode_values
+
+    values = pd.read_csv(HERA_DIR / "hera_repdat1.csv", dtype={"values": str})["values"]
+    return (lambda: decode_values(values)), len(values)
+
+
+def setup_notification_handlers(stack):
+    import HLTO_Readings_ios as collector
+
+    log_uuid = "40af0003-9479-43f6-ae95-c45fb2afb9d2"
+    hr_uuid = "00002a37-0000-1000-8000-00805f9b34fb"
+    temp_uuid = "00002a1c-0000-1000-8000-00805f9b34fb"
+    writer = csv.writer(_NullFile())
+    handlers = {
+        u: collector.make_notification_handler(u, rep_writer=writer, spo2_writer=writer, hrtemp_writer=writer)
+        for u in (log_uuid, hr_uuid, temp_uuid)
+    }
+
+    # Rebuild the notifications each logged row came from, in time order
+    events = []
+    rep = pd.read_csv(HERA_DIR / "hera_repdat1.csv", dtype=str)
+    for r in rep.itertuples(index=False):
+        events.append((r.pc_time, log_uuid, f"REP_DAT1 {r.device_ts},{r.values}\r\n".encode()))
+    spo2 = pd.read_csv(HERA_DIR / "hera_spo2.csv", dtype=str)
+    for r in spo2.itertuples(index=False):
+        events.append((r.pc_time, log_uuid, f"{r.raw_line}\r\n".encode()))
+    hrtemp = pd.read_csv(HERA_DIR / "hera_hr_temp.csv", dtype=str)
+    for r in hrtemp.itertuples(index=False):
+        if r.type == "hr":
+            events.append((r.pc_time, hr_uuid, bytes([0, int(r.value)])))
+        else:
+            events.append((r.pc_time, temp_uuid, bytes.fromhex(r.value)))
+    events.sort(key=lambda e: e[0])
+    nxt = _cycle([(handlers[u], bytearray(data)) for _, u, data in events])
+    sink = _NullFile()
+
+    def fn():
+        handler, data = nxt()
+        with contextlib.redirect_stdout(sink):
+            handler(0, data)
+    return fn, 1
+
+
+BENCHMARKS = [
+    Bench("read_exact", setup_read_exact(), "server.read_exact, one IMU packet"),
+    Bench("read_exact[fragmented]", setup_read_exact(TCP_SEGMENT),
+          f"server.read_exact, recv() returning <= {TCP_SEGMENT} bytes"),
+    Bench("decode", setup_decode, "server.parse_header + IMU struct unpack"),
+    Bench("csv_row", setup_csv_row, "server.py IMU CSV row: timestamp, writerow, flush"),
+    Bench("handle_client", setup_handle_client, "server.handle_client per packet, end to end"),
+    Bench("advertisement_callback", setup_advertisement_callback,
+          "HLTO_Readings_Final_ios.advertisement_callback per advert"),
+    Bench("decode_values", setup_decode_values, "analyze_hera_repdat1.decode_values per REP_DAT1 row"),
+    Bench("notification_handler", setup_notification_handlers,
+          "HLTO_Readings_ios notification handler per notification"),
+]
+
+
+# ----------------------------------------------------------------------
+# MEASUREMENT
+# ----------------------------------------------------------------------
+def measure(fn, items: int, min_time: float = MIN_TIME_S, repeat: int = REPEAT,
+            alloc_calls: int = ALLOC_CALLS) -> dict:
+    """
+    ops_per_s:  items per second, best of `repeat` runs of >= min_time
+    spread:     (median - best) / best over those runs; a rough noise
+                figure, worth checking before trusting a small change
+    alloc_b:    mean tracemalloc peak above the starting level during one
+                call, i.e. the bytes a call needs allocated at once
+    retained_b: bytes still held per call after alloc_calls calls
+    """
+    fn()  # warm up caches / lazy imports
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(round(number * min_time / elapsed)))
+    runs = sorted(timer.repeat(repeat, number))
+    best = runs[0]
+
+    n_alloc = max(1, min(alloc_calls, number))
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        peaks = 0
+        for _ in range(n_alloc):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks += tracemalloc.get_traced_memory()[1] - before
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_s": items * number / best,
+        "us_per_op": best / (items * number) * 1e6,
+        "spread": runs[len(runs) // 2] / best - 1,
+        "alloc_b": peaks / n_alloc / items,
+        "retained_b": retained / n_alloc / items,
+    }
+
+
+def compare(result: dict, base: dict, threshold: float = THRESHOLD) -> list:
+    """Regression messages for one benchmark (empty if none)."""
+    issues = []
+    if result["ops_per_s"] < base["ops_per_s"] * (1 - threshold):
+        issues.append(f"{1 - result['ops_per_s'] / base['ops_per_s']:.0%} slower")
+    grew = result["alloc_b"] - base["alloc_b"]
+    if grew > ALLOC_SLACK_B and result["alloc_b"] > base["alloc_b"] * (1 + threshold):
+        issues.append(f"+{grew:.0f} B/op allocated")
+    return issues
+
+
+def run(names=None, baseline_path=BASELINE_FILE, save: bool = False,
+        threshold: float = THRESHOLD, min_time: float = MIN_TIME_S) -> int:
+    baseline = {}
+    if Path(baseline_path).exists():
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+
+    results, regressions = {}, 0
+    print(f"{'benchmark':<24} {'ops/s':>12} {'us/op':>9} {'alloc B/op':>11} {'kept B/op':>10} {'spread':>7}  vs baseline")
+    for bench in BENCHMARKS:
+        if names and bench.name not in names:
+            continue
+        with contextlib.ExitStack() as stack:
+            fn, items = bench.setup(stack)
+            r = measure(fn, items, min_time)
+        results[bench.name] = r
+
+        note = "(no baseline)"
+        if bench.name in baseline:
+            base = baseline[bench.name]
+            issues = compare(r, base, threshold)
+            change = r["ops_per_s"] / base["ops_per_s"] - 1
+            note = f"{change:+.0%}" + (f"  REGRESSION: {', '.join(issues)}" if issues else "")
+            regressions += bool(issues)
+        print(f"{bench.name:<24} {r['ops_per_s']:>12,.0f} {r['us_per_op']:>9.2f} "
+              f"{r['alloc_b']:>11.0f} {r['retained_b']:>10.1f} {r['spread']:>7.1%}  {note}")
+
+    if save:
+        merged = dict(baseline, **results)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.platform(),
+                       "results": merged}, f, indent=2)
+        print(f"Saved baseline: {baseline_path}")
+    elif regressions:
+        print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks for the ingest / decode hot paths, driven by the bundled recordings."
+    )
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="baseline JSON to compare with")
+    parser.add_argument("--save", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="regression threshold (fraction)")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME_S, help="seconds per timing run")
+    parser.add_argument("--list", action="store_true", help="list benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for b in BENCHMARKS:
+            print(f"{b.name:<24} {b.doc}")
+        return 0
+
+    unknown = set(args.names) - {b.name for b in BENCHMARKS}
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    regressions = run(args.names, args.baseline, args.save, args.threshold, args.min_time)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
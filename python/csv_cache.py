@@ -0,0 +1,198 @@
+import io
+import json
+import os
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+# Timestamp string columns we know how to parse, and their formats.
+# Each one gets an extra int64 "<name>_ns" column (ns since Unix epoch).
+#   pc_time          -> Hera collectors, PC local wall-clock (naive)
+#   server_time_iso  -> server.py, UTC with "+00:00" suffix
+TIME_COLUMNS = {
+    "pc_time": "%Y-%m-%d %H:%M:%S.%f",
+    "server_time_iso": "ISO8601",
+}
+
+# int64 value used for timestamps that failed to parse
+NAT_NS = np.iinfo(np.int64).min
+
+SIDECAR_SUFFIX = ".cache.npz"
+CACHE_VERSION = 2
+
+# Bytes at the start of the CSV that must be unchanged for an append
+# to be treated as "the same file, grown"
+HEAD_CHECK_BYTES = 4096
+
+
+# ----------------------------------------------------------------------
+# PARSING
+# ----------------------------------------------------------------------
+def parse_time_ns(values: pd.Series, fmt: str) -> np.ndarray:
+    """
+    Parse timestamp strings into int64 ns since epoch. Strings with a UTC
+    offset are converted to UTC; naive strings keep their wall-clock value.
+    Unparseable entries become NAT_NS.
+    """
+    dt = pd.to_datetime(values, format=fmt, utc=True, errors="coerce")
+    ns = dt.dt.as_unit("ns").to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return ns
+
+
+def _parse_bytes(header: bytes, body: bytes) -> pd.DataFrame:
+    """Parse CSV rows (with the file's header line prepended)."""
+    df = pd.read_csv(io.BytesIO(header + body))
+    for col, fmt in TIME_COLUMNS.items():
+        if col in df.columns:
+            df[col + "_ns"] = parse_time_ns(df[col], fmt)
+    return df
+
+
+def _read_tail(path: Path, offset: int):
+    """
+    Return (header_line, complete_rows_after_offset, new_offset, tail),
+    where tail is whatever follows the last newline: an unterminated last
+    line, or one still being written. new_offset points before the tail.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = max(offset, f.tell())
+        f.seek(start)
+        body = f.read()
+
+    end = body.rfind(b"\n") + 1
+    return header, body[:end], start + end, body[end:]
+
+
+def _head_crc(path: Path, n_bytes: int = HEAD_CHECK_BYTES) -> int:
+    with open(path, "rb") as f:
+        return zlib.crc32(f.read(n_bytes))
+
+
+# ----------------------------------------------------------------------
+# SIDECAR
+# ----------------------------------------------------------------------
+def sidecar_path(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + SIDECAR_SUFFIX)
+
+
+def _save_sidecar(path: Path, df: pd.DataFrame, meta: dict):
+    arrays = {}
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        if values.dtype.kind in "biuf":
+            arrays[f"c{i}"] = values.to_numpy()
+        else:
+            arrays[f"c{i}"] = values.fillna("").astype(str).to_numpy(dtype=str)
+
+    meta = dict(meta, version=CACHE_VERSION, columns=list(df.columns))
+    arrays["meta"] = np.array(json.dumps(meta))
+
+    # Write-then-rename so a crashed save never leaves a torn cache
+    out = sidecar_path(path)
+    tmp = out.with_name(out.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, out)
+
+
+def _load_sidecar(path: Path):
+    """Return (DataFrame, meta) from the sidecar, or (None, None)."""
+    try:
+        with np.load(sidecar_path(path), allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if meta.get("version") != CACHE_VERSION:
+                return None, None
+            data = {col: npz[f"c{i}"] for i, col in enumerate(meta["columns"])}
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+    df = pd.DataFrame(data)
+    for col in df.columns:
+        if df[col].dtype.kind == "U":
+            df[col] = pd.Series(df[col]).where(df[col] != "")
+    return df, meta
+
+
+# ----------------------------------------------------------------------
+# PUBLIC LOADER
+# ----------------------------------------------------------------------
+def load_csv(path, refresh: bool = False, cache: bool = True) -> pd.DataFrame:
+    """
+    Load a recording CSV as a typed DataFrame, with every known timestamp
+    column also available as int64 "<name>_ns".
+
+    The parsed result is kept in a "<file>.cache.npz" sidecar keyed on the
+    CSV's size and mtime:
+      - unchanged file   -> sidecar is loaded as-is
+      - file has grown   -> only the appended rows are parsed and added
+      - anything else    -> full re-parse
+    refresh=True forces a full re-parse, cache=False skips the sidecar.
+
+    A last line without a trailing newline is included on a full parse,
+    held back while the file is growing (it may be half-written), and
+    picked up once a later load finds the file unchanged. A tail that
+    does not parse (cut off inside a quoted field) is always held back.
+    """
+    path = Path(path)
+    st = path.stat()
+
+    cached, meta = (None, None) if (refresh or not cache) else _load_sidecar(path)
+
+    unchanged = False
+    if cached is not None:
+        unchanged = meta["size"] == st.st_size and meta["mtime_ns"] == st.st_mtime_ns
+        if unchanged and (meta["tail_rows"] or meta["offset"] == st.st_size):
+            return cached
+
+        grown = unchanged or (
+            st.st_size > meta["size"]
+            and _head_crc(path, meta["head_len"]) == meta["head_crc"]
+        )
+        if not grown:
+            cached = None
+        elif meta["tail_rows"]:
+            # that row is re-read from offset below
+            cached = cached.iloc[:-meta["tail_rows"]]
+
+    offset = meta["offset"] if cached is not None else 0
+    header, body, new_offset, tail = _read_tail(path, offset)
+
+    new_rows, tail_rows = None, 0
+    if (cached is None or unchanged) and tail.strip():
+        try:
+            new_rows, tail_rows = _parse_bytes(header, body + tail + b"\n"), 1
+        except pd.errors.ParserError:
+            pass   # cut off mid-field; wait for the rest
+    if new_rows is None and (cached is None or body):
+        new_rows = _parse_bytes(header, body)
+
+    if cached is None:
+        df = new_rows
+    elif new_rows is not None:
+        if (list(new_rows.columns) != list(cached.columns)
+                or (new_rows.dtypes != cached.dtypes).any()):
+            # Column layout or types changed under us (e.g. text rows in
+            # a so far numeric column); start over so the result never
+            # depends on what was cached before
+            return load_csv(path, refresh=True, cache=cache)
+        df = pd.concat([cached, new_rows], ignore_index=True)
+    else:
+        df = cached
+
+    if cache:
+        _save_sidecar(path, df, {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "offset": new_offset,
+            "tail_rows": tail_rows,
+            "head_len": min(new_offset, HEAD_CHECK_BYTES),
+            "head_crc": _head_crc(path, min(new_offset, HEAD_CHECK_BYTES)),
+        })
+    return df
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from align_streams import device_segments
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+RATE_HZ = 50.0        # output grid rate
+WINDOW_S = 2.0        # window length
+HOP_S = 0.5           # step between window starts (overlap = WINDOW_S - HOP_S)
+
+CHUNK_ROWS = 200_000  # CSV rows read at a time
+GRID_BLOCK = 65_536   # grid points resampled at a time
+
+IMU_CHANNELS = ["accx", "accy", "accz", "gyrox", "gyroy", "gyroz"]
+POSE_POS_CHANNELS = ["px", "py", "pz"]
+POSE_QUAT_CHANNELS = ["qw", "qx", "qy", "qz"]
+CHANNELS = IMU_CHANNELS + POSE_POS_CHANNELS + POSE_QUAT_CHANNELS
+
+WINDOWS_FILE = "windows.npy"
+INDEX_FILE = "index.npz"
+META_FILE = "meta.json"
+
+
+# ----------------------------------------------------------------------
+# RESAMPLING
+# ----------------------------------------------------------------------
+def interp_channels(t_ns: np.ndarray, values: np.ndarray, grid_ns: np.ndarray) -> np.ndarray:
+    """Linear interpolation of every column of values onto grid_ns."""
+    out = np.empty((len(grid_ns), values.shape[1]))
+    for j in range(values.shape[1]):
+        out[:, j] = np.interp(grid_ns, t_ns, values[:, j])
+    return out
+
+
+def slerp_quats(t_ns: np.ndarray, q: np.ndarray, grid_ns: np.ndarray) -> np.ndarray:
+    """
+    Spherical interpolation of (w, x, y, z) quaternions onto grid_ns,
+    vectorized over all grid points. Takes the short way round.
+    """
+    hi = np.clip(np.searchsorted(t_ns, grid_ns, side="right"), 1, len(t_ns) - 1)
+    lo = hi - 1
+    span = (t_ns[hi] - t_ns[lo]).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        u = np.clip(np.where(span > 0, (grid_ns - t_ns[lo]) / span, 0.0), 0.0, 1.0)[:, None]
+
+    qa, qb = q[lo], q[hi]
+    dot = np.sum(qa * qb, axis=1, keepdims=True)
+    qb = np.where(dot < 0, -qb, qb)
+    dot = np.abs(dot)
+
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_t = np.sin(theta)
+    near = sin_t < 1e-6
+    with np.errstate(invalid="ignore", divide="ignore"):
+        wa = np.where(near, 1 - u, np.sin((1 - u) * theta) / sin_t)
+        wb = np.where(near, u, np.sin(u * theta) / sin_t)
+    out = wa * qa + wb * qb
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+# ----------------------------------------------------------------------
+# STREAMING INPUT
+# ----------------------------------------------------------------------
+def scan_sessions(path, chunksize: int = CHUNK_ROWS) -> list:
+    """(first_t_ns, last_t_ns) of every ML2 app session in a CSV, in one pass."""
+    sessions = []
+    prev_t = None
+    for chunk in pd.read_csv(path, usecols=["t_ns"], chunksize=chunksize):
+        t = chunk["t_ns"].to_numpy(dtype=np.int64)
+        seg = device_segments(t, prev_t) + max(len(sessions) - 1, 0)
+        for s in np.unique(seg):
+            ts = t[seg == s]
+            if s < len(sessions):
+                sessions[s] = (sessions[s][0], int(ts[-1]))
+            else:
+                sessions.append((int(ts[0]), int(ts[-1])))
+        prev_t = int(t[-1])
+    return sessions
+
+
+class _Cursor:
+    """
+    Walks one CSV in chunks, keeping only the rows still needed to
+    interpolate the current session from a given time onwards.
+    """
+
+    def __init__(self, path, cols, chunksize: int = CHUNK_ROWS):
+        self.cols = cols
+        self._chunks = pd.read_csv(path, usecols=["t_ns"] + cols, chunksize=chunksize)
+        self.t = np.empty(0, dtype=np.int64)
+        self.v = np.empty((0, len(cols)))
+        self.seg = np.empty(0, dtype=np.int64)
+        self._prev_t = None
+        self._seg_base = 0
+        self.done = False
+
+    def _pull(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.done = True
+            return
+        t = chunk["t_ns"].to_numpy(dtype=np.int64)
+        seg = device_segments(t, self._prev_t) + self._seg_base
+        self._seg_base = int(seg[-1])
+        self._prev_t = int(t[-1])
+
+        self.t = np.concatenate([self.t, t])
+        self.v = np.concatenate([self.v, chunk[self.cols].to_numpy(dtype=np.float64)])
+        self.seg = np.concatenate([self.seg, seg])
+
+    def rows(self, session: int, t_end: int):
+        """Buffered rows of session, read far enough to cover t_end."""
+        while not self.done:
+            later = self.seg > session
+            if later.any() or (len(self.t) and self.t[-1] >= t_end and self.seg[-1] == session):
+                break
+            self._pull()
+        m = self.seg == session
+        return self.t[m], self.v[m]
+
+    def drop_before(self, session: int, t_keep: int):
+        """Forget rows no longer needed: keep one row before t_keep for interpolation."""
+        old = (self.seg < session) | ((self.seg == session) & (self.t < t_keep))
+        n_old = int(np.count_nonzero(old))
+        if n_old > 1:
+            keep = np.ones(len(self.t), dtype=bool)
+            keep[np.flatnonzero(old)[:-1]] = False
+            self.t, self.v, self.seg = self.t[keep], self.v[keep], self.seg[keep]
+
+
+# ----------------------------------------------------------------------
+# EXPORT
+# ----------------------------------------------------------------------
+def export_windows(imu_path, pose_path, out_dir, rate_hz: float = RATE_HZ,
+                   window_s: float = WINDOW_S, hop_s: float = HOP_S,
+                   chunksize: int = CHUNK_ROWS) -> int:
+    """
+    Resample imu.csv (linear) and headpose.csv (slerp) onto a fixed-rate
+    grid per ML2 session, cut overlapping windows and write them to a
+    preallocated float32 memmap of shape (n_windows, window_len, channels).
+
+    A first pass only scans t_ns to size the dataset; the second streams
+    both CSVs chunk by chunk, so memory stays bounded by chunksize and
+    GRID_BLOCK, not by recording length. Returns the number of windows.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    step_ns = int(round(1e9 / rate_hz))
+    win = int(round(window_s * rate_hz))
+    hop = max(1, int(round(hop_s * rate_hz)))
+
+    imu_sessions = scan_sessions(imu_path, chunksize)
+    pose_sessions = scan_sessions(pose_path, chunksize)
+    if len(imu_sessions) != len(pose_sessions):
+        print(f"[export] warning: {len(imu_sessions)} IMU vs {len(pose_sessions)} "
+              f"headpose sessions; using the first {min(len(imu_sessions), len(pose_sessions))}")
+
+    plan = []
+    for s, (ia, pa) in enumerate(zip(imu_sessions, pose_sessions)):
+        lo, hi = max(ia[0], pa[0]), min(ia[1], pa[1])
+        n_grid = (hi - lo) // step_ns + 1 if hi >= lo else 0
+        n_win = (n_grid - win) // hop + 1 if n_grid >= win else 0
+        plan.append((s, lo, n_grid, n_win))
+
+    total = sum(p[3] for p in plan)
+    windows = np.lib.format.open_memmap(
+        out_dir / WINDOWS_FILE, mode="w+", dtype=np.float32,
+        shape=(total, win, len(CHANNELS)),
+    ) if total else None
+    index_session = np.empty(total, dtype=np.int32)
+    index_t0 = np.empty(total, dtype=np.int64)
+
+    imu_cur = _Cursor(imu_path, IMU_CHANNELS, chunksize)
+    pose_cur = _Cursor(pose_path, POSE_POS_CHANNELS + POSE_QUAT_CHANNELS, chunksize)
+
+    w_out = 0
+    for s, lo, n_grid, n_win in plan:
+        if n_win == 0:
+            continue
+        pending = np.empty((0, len(CHANNELS)), dtype=np.float32)
+        pending_t = np.empty(0, dtype=np.int64)
+
+        for g0 in range(0, n_grid, GRID_BLOCK):
+            grid = lo + step_ns * np.arange(g0, min(g0 + GRID_BLOCK, n_grid), dtype=np.int64)
+
+            it, iv = imu_cur.rows(s, int(grid[-1]))
+            pt, pv = pose_cur.rows(s, int(grid[-1]))
+            q = pv[:, 3:]
+            block = np.concatenate([
+                interp_channels(it, iv, grid),
+                interp_channels(pt, pv[:, :3], grid),
+                slerp_quats(pt, q / np.linalg.norm(q, axis=1, keepdims=True), grid),
+            ], axis=1).astype(np.float32)
+            imu_cur.drop_before(s, int(grid[-1]))
+            pose_cur.drop_before(s, int(grid[-1]))
+
+            pending = np.concatenate([pending, block])
+            pending_t = np.concatenate([pending_t, grid])
+
+            starts = np.arange(0, len(pending) - win + 1, hop)
+            if len(starts):
+                n = len(starts)
+                cut = sliding_window_view(pending, win, axis=0)[starts]
+                windows[w_out:w_out + n] = cut.transpose(0, 2, 1)
+                index_session[w_out:w_out + n] = s
+                index_t0[w_out:w_out + n] = pending_t[starts]
+                w_out += n
+                nxt = starts[-1] + hop
+                pending, pending_t = pending[nxt:], pending_t[nxt:]
+
+    if windows is not None:
+        windows.flush()
+        del windows
+
+    np.savez(out_dir / INDEX_FILE, session=index_session[:w_out], t0_ns=index_t0[:w_out])
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump({
+            "n_windows": w_out,
+            "window_len": win,
+            "channels": CHANNELS,
+            "rate_hz": rate_hz,
+            "hop": hop,
+            "source_imu": os.path.abspath(imu_path),
+            "source_headpose": os.path.abspath(pose_path),
+        }, f, indent=2)
+    return w_out
+
+
+def open_dataset(out_dir):
+    """
+    Open an exported dataset without loading it: returns (windows, index,
+    meta) where windows is a read-only memmap (n_windows, window_len,
+    channels) and index a DataFrame of session / t0_ns per window.
+    """
+    out_dir = Path(out_dir)
+    with open(out_dir / META_FILE, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    with np.load(out_dir / INDEX_FILE) as idx:
+        index = pd.DataFrame({"session": idx["session"], "t0_ns": idx["t0_ns"]})
+    if meta["n_windows"] == 0:
+        windows = np.empty((0, meta["window_len"], len(meta["channels"])), dtype=np.float32)
+    else:
+        windows = np.load(out_dir / WINDOWS_FILE, mmap_mode="r")
+    return windows, index, meta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export fixed-rate, windowed IMU + headpose tensors as a memory-mapped dataset."
+    )
+    parser.add_argument("imu", help="path/to/imu.csv")
+    parser.add_argument("headpose", help="path/to/headpose.csv")
+    parser.add_argument("out_dir", help="folder to write windows.npy / index.npz / meta.json")
+    parser.add_argument("--rate", type=float, default=RATE_HZ, help="grid rate in Hz")
+    parser.add_argument("--window", type=float, default=WINDOW_S, help="window length in s")
+    parser.add_argument("--hop", type=float, default=HOP_S, help="window step in s")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    n = export_windows(args.imu, args.headpose, args.out_dir, args.rate,
+                       args.window, args.hop, args.chunksize)
+    windows, _, meta = open_dataset(args.out_dir)
+    print(f"Wrote {n} windows of {meta['window_len']} x {len(meta['channels'])} "
+          f"to {args.out_dir} ({windows.nbytes / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from align_streams import device_segments
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+# Quaternions in this module are (w, x, y, z) along the last axis.
+# headpose.csv stores them as qx, qy, qz, qw; see pose_quaternions().
+
+COMPLEMENTARY_ALPHA = 0.98   # weight of the gyro path per step
+MADGWICK_BETA = 0.1          # gradient-descent gain
+
+# dt is clipped to this, so a dropped connection doesn't integrate a
+# multi-second gap as one giant gyro step
+MAX_DT_S = 0.5
+
+# Block length for the vectorized complementary recurrence; bounded so
+# alpha**-BLOCK stays well inside float64 precision
+MAX_BLOCK = 256
+
+
+# ----------------------------------------------------------------------
+# QUATERNION HELPERS
+# ----------------------------------------------------------------------
+def quat_normalize(q: np.ndarray) -> np.ndarray:
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quat_conj(q: np.ndarray) -> np.ndarray:
+    return q * np.array([1.0, -1.0, -1.0, -1.0])
+
+
+def quat_mul(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ], axis=-1)
+
+
+def quat_angle(q: np.ndarray) -> np.ndarray:
+    """Rotation angle (rad, 0..pi) of each quaternion."""
+    w = np.abs(np.clip(q[..., 0], -1.0, 1.0))
+    return 2.0 * np.arccos(w)
+
+
+def euler_to_quat(roll, pitch, yaw) -> np.ndarray:
+    """ZYX (yaw-pitch-roll) Euler angles to quaternions, vectorized."""
+    cr, sr = np.cos(roll / 2), np.sin(roll / 2)
+    cp, sp = np.cos(pitch / 2), np.sin(pitch / 2)
+    cy, sy = np.cos(yaw / 2), np.sin(yaw / 2)
+    return np.stack([
+        cr * cp * cy + sr * sp * sy,
+        sr * cp * cy - cr * sp * sy,
+        cr * sp * cy + sr * cp * sy,
+        cr * cp * sy - sr * sp * cy,
+    ], axis=-1)
+
+
+def accel_tilt(acc: np.ndarray):
+    """Roll and pitch (rad) implied by the gravity direction in acc."""
+    ax, ay, az = acc[..., 0], acc[..., 1], acc[..., 2]
+    roll = np.arctan2(ay, az)
+    pitch = np.arctan2(-ax, np.sqrt(ay * ay + az * az))
+    return roll, pitch
+
+
+def accel_quat(acc: np.ndarray) -> np.ndarray:
+    """Zero-yaw orientation matching the gravity direction in acc."""
+    roll, pitch = accel_tilt(acc)
+    return euler_to_quat(roll, pitch, np.zeros_like(roll))
+
+
+def sample_dt(t_ns: np.ndarray, prev_t_ns=None) -> np.ndarray:
+    """
+    Per-sample dt in seconds. The first sample gets dt=0, matching the
+    step filters, which only initialise on their first update, or the
+    gap since prev_t_ns when continuing a stream.
+    """
+    t = np.asarray(t_ns, dtype=np.int64)
+    first = t[:1] if prev_t_ns is None else np.array([prev_t_ns], dtype=np.int64)
+    d = np.diff(t, prepend=first) / 1e9
+    return np.clip(d, 0.0, MAX_DT_S)
+
+
+# ----------------------------------------------------------------------
+# COMPLEMENTARY FILTER
+# ----------------------------------------------------------------------
+def _first_order_recurrence(u: np.ndarray, alpha: float, x0) -> np.ndarray:
+    """
+    Solve x[k] = alpha * x[k-1] + u[k] along axis 0 with x[-1] = x0.
+
+    Inside a block of length B the closed form
+        x[k0+j] = alpha^(j+1) x[k0-1] + alpha^j * cumsum(alpha^-i u[k0+i])
+    is evaluated for all blocks at once; only the carry between blocks
+    is a (short) Python loop.
+    """
+    n = len(u)
+    if n == 0:
+        return u.copy()
+    if alpha <= 0.0:
+        return u.copy()
+
+    block = MAX_BLOCK if alpha >= 1.0 else int(min(MAX_BLOCK, max(1, 20.0 / -np.log(alpha))))
+    n_blocks = -(-n // block)
+    pad = n_blocks * block - n
+
+    tail = u.shape[1:]
+    ub = np.concatenate([u, np.zeros((pad,) + tail)]).reshape((n_blocks, block) + tail)
+
+    j = np.arange(block, dtype=np.float64).reshape((1, block) + (1,) * len(tail))
+    inner = alpha ** j * np.cumsum(ub * alpha ** -j, axis=1)
+    decay = alpha ** (j + 1)
+
+    out = np.empty_like(inner)
+    carry = np.broadcast_to(np.asarray(x0, dtype=np.float64), tail)
+    for b in range(n_blocks):
+        out[b] = decay[0] * carry + inner[b]
+        carry = out[b, -1]
+
+    return out.reshape((n_blocks * block,) + tail)[:n]
+
+
+def complementary_batch(t_ns, acc, gyro, alpha: float = COMPLEMENTARY_ALPHA, init=None):
+    """
+    Complementary filter over a whole recording.
+
+    roll/pitch blend integrated gyro with accelerometer tilt; yaw is
+    gyro-only (the ML2 stream carries no magnetometer). Returns (N, 4)
+    quaternions and the final (roll, pitch, yaw, last_t_ns) state. Pass
+    that state as init to continue the same stream: the result matches
+    one call over the concatenated samples. A plain (roll, pitch, yaw)
+    init seeds the filter with dt=0 on the first sample.
+    """
+    acc = np.asarray(acc, dtype=np.float64)
+    gyro = np.asarray(gyro, dtype=np.float64)
+    dt = sample_dt(t_ns, init[3] if init is not None and len(init) > 3 else None)
+
+    roll_acc, pitch_acc = accel_tilt(acc)
+    # The ML2 sits near roll = +-180 deg at rest; unwrap so sensor noise
+    # doesn't flip the tilt reference between the two ends
+    roll_acc = np.unwrap(roll_acc)
+    if init is None:
+        init = (roll_acc[0], pitch_acc[0], 0.0) if len(acc) else (0.0, 0.0, 0.0)
+    elif len(acc):
+        roll_acc += 2 * np.pi * np.round((init[0] - roll_acc[0]) / (2 * np.pi))
+
+    u = np.stack([
+        alpha * gyro[:, 0] * dt + (1 - alpha) * roll_acc,
+        alpha * gyro[:, 1] * dt + (1 - alpha) * pitch_acc,
+    ], axis=-1)
+    rp = _first_order_recurrence(u, alpha, init[:2])
+    yaw = init[2] + np.cumsum(gyro[:, 2] * dt)
+
+    q = euler_to_quat(rp[:, 0], rp[:, 1], yaw)
+    if len(q):
+        state = (rp[-1, 0], rp[-1, 1], yaw[-1], int(t_ns[-1]))
+    else:
+        state = tuple(init)
+    return q, state
+
+
+class ComplementaryFilter:
+    """Incremental complementary filter; same maths as complementary_batch."""
+
+    def __init__(self, alpha: float = COMPLEMENTARY_ALPHA):
+        self.alpha = alpha
+        self.state = None
+        self.last_t_ns = None
+
+    def update(self, t_ns: int, acc, gyro) -> np.ndarray:
+        ax, ay, az = acc
+        roll_acc = np.arctan2(ay, az)
+        pitch_acc = np.arctan2(-ax, np.sqrt(ay * ay + az * az))
+
+        if self.state is None:
+            self.state = (roll_acc, pitch_acc, 0.0)
+        else:
+            dt = min(max((t_ns - self.last_t_ns) / 1e9, 0.0), MAX_DT_S)
+            roll, pitch, yaw = self.state
+            roll_acc += 2 * np.pi * np.round((roll - roll_acc) / (2 * np.pi))
+            a = self.alpha
+            self.state = (
+                a * (roll + gyro[0] * dt) + (1 - a) * roll_acc,
+                a * (pitch + gyro[1] * dt) + (1 - a) * pitch_acc,
+                yaw + gyro[2] * dt,
+            )
+        self.last_t_ns = t_ns
+        return euler_to_quat(*self.state)
+
+
+# ----------------------------------------------------------------------
+# MADGWICK FILTER (IMU-only)
+# ----------------------------------------------------------------------
+def _madgwick_step(q, a, g, dt, beta):
+    """
+    One Madgwick IMU update. q (...,4), a/g (...,3), dt (...) may carry
+    any leading shape, so one call advances many independent filters.
+    """
+    q0, q1, q2, q3 = np.moveaxis(q, -1, 0)
+    gx, gy, gz = np.moveaxis(g, -1, 0)
+
+    qdot = 0.5 * np.stack([
+        -q1 * gx - q2 * gy - q3 * gz,
+        q0 * gx + q2 * gz - q3 * gy,
+        q0 * gy - q1 * gz + q3 * gx,
+        q0 * gz + q1 * gy - q2 * gx,
+    ], axis=-1)
+
+    norm = np.linalg.norm(a, axis=-1)
+    valid = norm > 0
+    ax, ay, az = np.moveaxis(a / np.where(valid, norm, 1.0)[..., None], -1, 0)
+
+    s = np.stack([
+        4 * q0 * q2 * q2 + 2 * q2 * ax + 4 * q0 * q1 * q1 - 2 * q1 * ay,
+        4 * q1 * q3 * q3 - 2 * q3 * ax + 4 * q0 * q0 * q1 - 2 * q0 * ay - 4 * q1
+        + 8 * q1 * q1 * q1 + 8 * q1 * q2 * q2 + 4 * q1 * az,
+        4 * q0 * q0 * q2 + 2 * q0 * ax + 4 * q2 * q3 * q3 - 2 * q3 * ay - 4 * q2
+        + 8 * q2 * q1 * q1 + 8 * q2 * q2 * q2 + 4 * q2 * az,
+        4 * q1 * q1 * q3 - 2 * q1 * ax + 4 * q2 * q2 * q3 - 2 * q2 * ay,
+    ], axis=-1)
+    s_norm = np.linalg.norm(s, axis=-1, keepdims=True)
+    s = np.where(s_norm > 0, s / np.where(s_norm > 0, s_norm, 1.0), 0.0)
+
+    qdot = qdot - (beta * valid)[..., None] * s
+    return quat_normalize(q + qdot * np.asarray(dt)[..., None])
+
+
+def madgwick_batch(t_ns, acc, gyro, beta=MADGWICK_BETA, q0=None):
+    """
+    Madgwick filter over whole recordings.
+
+    The update is a nonlinear recursion, so time is stepped in a loop,
+    but every step is a NumPy operation over all leading dimensions:
+    acc/gyro of shape (..., N, 3) (and beta broadcastable to (...)) run
+    many recordings or a whole beta sweep in the same pass.
+    """
+    acc = np.asarray(acc, dtype=np.float64)
+    gyro = np.asarray(gyro, dtype=np.float64)
+    dt = sample_dt(t_ns)
+    lead = acc.shape[:-2]
+    n = acc.shape[-2]
+
+    beta = np.broadcast_to(np.asarray(beta, dtype=np.float64), lead)
+    if q0 is None:
+        q0 = accel_quat(acc[..., 0, :]) if n else np.array([1.0, 0.0, 0.0, 0.0])
+    q = np.broadcast_to(q0, lead + (4,)).copy()
+
+    out = np.empty(lead + (n, 4))
+    for k in range(n):
+        q = _madgwick_step(q, acc[..., k, :], gyro[..., k, :], dt[k], beta)
+        out[..., k, :] = q
+    return out
+
+
+class MadgwickFilter:
+    """
+    Incremental Madgwick filter for live use (e.g. from server.py); same
+    maths as madgwick_batch, seeded from the first accelerometer sample.
+    """
+
+    def __init__(self, beta: float = MADGWICK_BETA):
+        self.beta = beta
+        self.q = np.array([1.0, 0.0, 0.0, 0.0])
+        self.last_t_ns = None
+
+    def update(self, t_ns: int, acc, gyro) -> np.ndarray:
+        if self.last_t_ns is None:
+            self.q = accel_quat(np.asarray(acc, dtype=np.float64))
+            dt = 0.0
+        else:
+            dt = min(max((t_ns - self.last_t_ns) / 1e9, 0.0), MAX_DT_S)
+        self.q = _madgwick_step(self.q, np.asarray(acc, dtype=np.float64),
+                                np.asarray(gyro, dtype=np.float64), dt, self.beta)
+        self.last_t_ns = t_ns
+        return self.q
+
+
+# ----------------------------------------------------------------------
+# RECORDINGS
+# ----------------------------------------------------------------------
+IMU_ACC_COLS = ["accx", "accy", "accz"]
+IMU_GYRO_COLS = ["gyrox", "gyroy", "gyroz"]
+
+
+def pose_quaternions(pose: pd.DataFrame) -> np.ndarray:
+    """headpose.csv qx,qy,qz,qw -> (N, 4) in (w, x, y, z) order."""
+    return quat_normalize(pose[["qw", "qx", "qy", "qz"]].to_numpy(dtype=np.float64))
+
+
+def fuse_recording(imu: pd.DataFrame, method: str = "complementary") -> np.ndarray:
+    """
+    Orientation for every imu.csv row. The filter restarts at each ML2
+    app session (device clock reset), like the recording itself does.
+    """
+    t = imu["t_ns"].to_numpy(dtype=np.int64)
+    acc = imu[IMU_ACC_COLS].to_numpy(dtype=np.float64)
+    gyro = imu[IMU_GYRO_COLS].to_numpy(dtype=np.float64)
+    seg = device_segments(t)
+
+    out = np.empty((len(imu), 4))
+    for s in np.unique(seg):
+        m = seg == s
+        if method == "complementary":
+            out[m], _ = complementary_batch(t[m], acc[m], gyro[m])
+        elif method == "madgwick":
+            out[m] = madgwick_batch(t[m], acc[m], gyro[m])
+        else:
+            raise ValueError(f"Unknown fusion method '{method}'")
+    return out
+
+
+def compare_with_headpose(imu: pd.DataFrame, q_est: np.ndarray, pose: pd.DataFrame) -> dict:
+    """
+    Compare fused orientation against headpose quaternions.
+
+    IMU and camera frames differ by an unknown fixed mounting rotation,
+    so we compare the angle of the rotation since each session's first
+    matched sample (invariant to that mounting). Pose rows are matched to
+    the nearest IMU row on the shared device clock, within a session.
+    """
+    it = imu["t_ns"].to_numpy(dtype=np.int64)
+    pt = pose["t_ns"].to_numpy(dtype=np.int64)
+    iseg = device_segments(it)
+    pseg = device_segments(pt)
+    q_pose = pose_quaternions(pose)
+
+    errs, est_all, pose_all = [], [], []
+    for s in np.intersect1d(np.unique(iseg), np.unique(pseg)):
+        im, pm = np.flatnonzero(iseg == s), np.flatnonzero(pseg == s)
+        if len(im) < 2 or len(pm) < 2:
+            continue
+        idx = np.clip(np.searchsorted(it[im], pt[pm]), 1, len(im) - 1)
+        prev_closer = (pt[pm] - it[im][idx - 1]) < (it[im][idx] - pt[pm])
+        idx = im[idx - prev_closer]
+
+        qe, qp = q_est[idx], q_pose[pm]
+        ang_est = quat_angle(quat_mul(quat_conj(qe[:1]), qe))
+        ang_pose = quat_angle(quat_mul(quat_conj(qp[:1]), qp))
+        errs.append(ang_est - ang_pose)
+        est_all.append(ang_est)
+        pose_all.append(ang_pose)
+
+    if not errs:
+        return {"n_matched": 0}
+
+    err = np.concatenate(errs)
+    est_all, pose_all = np.concatenate(est_all), np.concatenate(pose_all)
+    corr = np.nan
+    if est_all.std() > 0 and pose_all.std() > 0:
+        corr = float(np.corrcoef(est_all, pose_all)[0, 1])
+    return {
+        "n_matched": int(len(err)),
+        "rms_err_deg": float(np.degrees(np.sqrt(np.mean(err ** 2)))),
+        "max_err_deg": float(np.degrees(np.max(np.abs(err)))),
+        "pose_motion_deg": float(np.degrees(pose_all.max())),
+        "est_motion_deg": float(np.degrees(est_all.max())),
+        "corr": corr,
+    }
+
+
+def benchmark(imu: pd.DataFrame, min_samples: int = 200_000) -> dict:
+    """Throughput (samples/s) of the batch and step APIs on this recording."""
+    reps = max(1, -(-min_samples // len(imu)))
+    big = pd.concat([imu] * reps, ignore_index=True)
+    # Make the tiled clock monotonic so it stays a single session
+    step = int(np.median(np.diff(imu["t_ns"]))) or 1
+    big["t_ns"] = np.arange(len(big), dtype=np.int64) * step
+
+    t = big["t_ns"].to_numpy()
+    acc = big[IMU_ACC_COLS].to_numpy(dtype=np.float64)
+    gyro = big[IMU_GYRO_COLS].to_numpy(dtype=np.float64)
+    n_step = min(len(big), 20_000)
+
+    def rate(fn, n):
+        t0 = time.perf_counter()
+        fn()
+        return n / (time.perf_counter() - t0)
+
+    def run_step(filt):
+        for k in range(n_step):
+            filt.update(t[k], acc[k], gyro[k])
+
+    return {
+        "complementary_batch": rate(lambda: complementary_batch(t, acc, gyro), len(big)),
+        "madgwick_batch": rate(lambda: madgwick_batch(t[:n_step], acc[:n_step], gyro[:n_step]), n_step),
+        "madgwick_batch_x16": rate(
+            lambda: madgwick_batch(t[:n_step], np.broadcast_to(acc[:n_step], (16, n_step, 3)),
+                                   np.broadcast_to(gyro[:n_step], (16, n_step, 3)),
+                                   beta=np.linspace(0.01, 0.5, 16)),
+            16 * n_step),
+        "complementary_step": rate(lambda: run_step(ComplementaryFilter()), n_step),
+        "madgwick_step": rate(lambda: run_step(MadgwickFilter()), n_step),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate orientation from imu.csv and check it against headpose.csv.")
+    parser.add_argument("imu", help="path/to/imu.csv")
+    parser.add_argument("headpose", nargs="?", default=None, help="path/to/headpose.csv")
+    parser.add_argument("--method", choices=("complementary", "madgwick", "both"), default="both")
+    parser.add_argument("--out", default=None, help="write fused quaternions to this CSV")
+    parser.add_argument("--bench", action="store_true", help="also report throughput in samples/s")
+    args = parser.parse_args(argv)
+
+    imu = pd.read_csv(args.imu)
+    pose = pd.read_csv(args.headpose) if args.headpose else None
+    methods = ["complementary", "madgwick"] if args.method == "both" else [args.method]
+
+    out = imu[["t_ns"]].copy()
+    for method in methods:
+        t0 = time.perf_counter()
+        q = fuse_recording(imu, method)
+        elapsed = time.perf_counter() - t0
+        print(f"{method}: {len(imu)} samples in {elapsed:.3f}s ({len(imu) / elapsed:,.0f} samples/s)")
+
+        for j, c in enumerate("wxyz"):
+            out[f"{method}_q{c}"] = q[:, j]
+
+        if pose is not None:
+            for key, val in compare_with_headpose(imu, q, pose).items():
+                print(f"  {key}: {val}")
+
+    if args.out:
+        out.to_csv(args.out, index=False)
+        print(f"Saved: {args.out}")
+
+    if args.bench:
+        print("\nThroughput (samples/s):")
+        for name, r in benchmark(imu).items():
+            print(f"  {name:22s} {r:14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from align_streams import device_segments
+from imu_fusion import IMU_GYRO_COLS, pose_quaternions, quat_angle, quat_conj, quat_mul
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+GRID_HZ = 100.0       # common resampling rate
+WINDOW_S = 10.0       # cross-correlation window length
+HOP_S = 2.0           # step between window starts
+MAX_LAG_S = 0.5       # search lags in [-MAX_LAG_S, +MAX_LAG_S]
+
+# Windows whose signals are flatter than this (rad/s std) are skipped;
+# without head motion there is nothing to correlate
+MIN_MOTION_STD = 1e-3
+
+
+# ----------------------------------------------------------------------
+# SIGNALS
+# ----------------------------------------------------------------------
+def pose_angular_speed(t_ns: np.ndarray, q: np.ndarray) -> tuple:
+    """
+    Angular speed (rad/s) from consecutive headpose quaternions, stamped
+    at the midpoint of each pair. Speed is frame-independent, so it can
+    be compared with the gyro without knowing the IMU-camera mounting.
+    """
+    dq = quat_mul(quat_conj(q[:-1]), q[1:])
+    dt = np.diff(t_ns) / 1e9
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = quat_angle(dq) / dt
+    t_mid = t_ns[:-1] + np.diff(t_ns) // 2
+    ok = dt > 0
+    return t_mid[ok], speed[ok]
+
+
+def gyro_speed(imu: pd.DataFrame) -> np.ndarray:
+    return np.linalg.norm(imu[IMU_GYRO_COLS].to_numpy(dtype=np.float64), axis=1)
+
+
+def resample(t_ns: np.ndarray, values: np.ndarray, grid_ns: np.ndarray) -> np.ndarray:
+    return np.interp(grid_ns, t_ns, values)
+
+
+# ----------------------------------------------------------------------
+# LAG ESTIMATION
+# ----------------------------------------------------------------------
+def windowed_lag(a: np.ndarray, b: np.ndarray, rate_hz: float, window_s: float = WINDOW_S,
+                 hop_s: float = HOP_S, max_lag_s: float = MAX_LAG_S):
+    """
+    Lag of b relative to a in every sliding window, by FFT
+    cross-correlation. All windows are transformed in one batched rfft.
+
+    Returns (window_start_index, lag_s, peak_corr). lag_s > 0 means b
+    happens later than a. peak_corr is the normalised correlation at
+    the peak; windows without motion get NaN.
+    """
+    w = int(round(window_s * rate_hz))
+    hop = max(1, int(round(hop_s * rate_hz)))
+    max_lag = int(round(max_lag_s * rate_hz))
+    if len(a) < w or w < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+
+    wa = sliding_window_view(a, w)[::hop]
+    wb = sliding_window_view(b, w)[::hop]
+    starts = np.arange(len(wa)) * hop
+
+    wa = wa - wa.mean(axis=1, keepdims=True)
+    wb = wb - wb.mean(axis=1, keepdims=True)
+    sa = wa.std(axis=1)
+    sb = wb.std(axis=1)
+
+    n_fft = 1 << int(np.ceil(np.log2(2 * w)))
+    fa = np.fft.rfft(wa, n_fft, axis=1)
+    fb = np.fft.rfft(wb, n_fft, axis=1)
+    xc = np.fft.irfft(np.conj(fa) * fb, n_fft, axis=1)
+
+    # Lags -max_lag..+max_lag, laid out contiguously
+    xc = np.concatenate([xc[:, n_fft - max_lag:], xc[:, :max_lag + 1]], axis=1)
+    peak = np.argmax(xc, axis=1)
+
+    # Parabolic interpolation around the peak for sub-sample lag
+    rows = np.arange(len(xc))
+    left = xc[rows, np.clip(peak - 1, 0, xc.shape[1] - 1)]
+    mid = xc[rows, peak]
+    right = xc[rows, np.clip(peak + 1, 0, xc.shape[1] - 1)]
+    denom = left - 2 * mid + right
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.where((denom < 0) & (peak > 0) & (peak < xc.shape[1] - 1), 0.5 * (left - right) / denom, 0.0)
+
+    lag_s = (peak - max_lag + frac) / rate_hz
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = mid / (w * sa * sb)
+
+    flat = (sa < MIN_MOTION_STD) | (sb < MIN_MOTION_STD)
+    lag_s[flat] = np.nan
+    corr[flat] = np.nan
+    return starts, lag_s, corr
+
+
+def estimate_lag(imu: pd.DataFrame, pose: pd.DataFrame, rate_hz: float = GRID_HZ,
+                 window_s: float = WINDOW_S, hop_s: float = HOP_S,
+                 max_lag_s: float = MAX_LAG_S) -> pd.DataFrame:
+    """
+    Lag of headpose relative to the IMU over time, one row per window.
+    Both streams share the device clock (t_ns), so each ML2 app session
+    is processed separately on its own overlap.
+    """
+    it = imu["t_ns"].to_numpy(dtype=np.int64)
+    pt = pose["t_ns"].to_numpy(dtype=np.int64)
+    iseg, pseg = device_segments(it), device_segments(pt)
+    g = gyro_speed(imu)
+    q = pose_quaternions(pose)
+
+    rows = []
+    step_ns = int(1e9 / rate_hz)
+    for s in np.intersect1d(np.unique(iseg), np.unique(pseg)):
+        im, pm = iseg == s, pseg == s
+        if im.sum() < 2 or pm.sum() < 3:
+            continue
+
+        p_t, p_speed = pose_angular_speed(pt[pm], q[pm])
+        i_t, i_speed = it[im], g[im]
+        lo, hi = max(i_t[0], p_t[0]), min(i_t[-1], p_t[-1])
+        if hi - lo < window_s * 1e9:
+            continue
+
+        grid = np.arange(lo, hi, step_ns, dtype=np.int64)
+        a = resample(i_t, i_speed, grid)
+        b = resample(p_t, p_speed, grid)
+
+        starts, lag_s, corr = windowed_lag(a, b, rate_hz, window_s, hop_s, max_lag_s)
+        centre = grid[np.minimum(starts + int(window_s * rate_hz) // 2, len(grid) - 1)]
+        rows.append(pd.DataFrame({
+            "session": s,
+            "t_ns": centre,
+            "lag_ms": lag_s * 1e3,
+            "corr": corr,
+        }))
+
+    if not rows:
+        return pd.DataFrame(columns=["session", "t_ns", "lag_ms", "corr"])
+    return pd.concat(rows, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Estimate how far headpose lags the IMU gyro, over time."
+    )
+    parser.add_argument("imu", help="path/to/imu.csv")
+    parser.add_argument("headpose", help="path/to/headpose.csv")
+    parser.add_argument("--rate", type=float, default=GRID_HZ, help="resampling rate in Hz")
+    parser.add_argument("--window", type=float, default=WINDOW_S, help="window length in s")
+    parser.add_argument("--hop", type=float, default=HOP_S, help="window step in s")
+    parser.add_argument("--max-lag", type=float, default=MAX_LAG_S, help="largest lag searched in s")
+    parser.add_argument("--out", default=None, help="write per-window lags to this CSV")
+    args = parser.parse_args(argv)
+
+    imu = pd.read_csv(args.imu)
+    pose = pd.read_csv(args.headpose)
+
+    t0 = time.perf_counter()
+    lags = estimate_lag(imu, pose, args.rate, args.window, args.hop, args.max_lag)
+    elapsed = time.perf_counter() - t0
+
+    valid = lags.dropna(subset=["lag_ms"])
+    print(f"{len(lags)} windows in {elapsed:.3f}s, {len(valid)} with enough motion")
+    if len(valid):
+        print(f"Headpose lag vs IMU: median {valid['lag_ms'].median():.1f} ms, "
+              f"IQR {valid['lag_ms'].quantile(0.25):.1f}..{valid['lag_ms'].quantile(0.75):.1f} ms, "
+              f"median corr {valid['corr'].median():.2f}")
+    else:
+        print("No window had motion in both streams (is the headpose stuck?)")
+
+    if args.out:
+        lags.to_csv(args.out, index=False)
+        print(f"Saved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
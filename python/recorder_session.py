@@ -0,0 +1,281 @@
+import argparse
+import io
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+# Layout written by ML2NativeRecorder's Recorder.kt:
+#   <session>/imu.csv                         mono_ns,sensor_ts_ns,type,values("a;b;c")
+#   <session>/cam/frame_%06d_i420_WxH.bin     raw I420 bytes
+#   <session>/cam/frame_%06d.json             {mono_ns, image_reader_timestamp_ns, width, height}
+CAM_DIR = "cam"
+IMU_CSV = "imu.csv"
+FRAME_BIN_RE = re.compile(r"frame_(\d+)_i420_(\d+)x(\d+)\.bin$")
+
+# Packed outputs, written next to the originals
+FRAMES_FILE = "frames.bin"
+FRAMES_INDEX = "frames_index.npz"
+IMU_PACKED = "imu.npz"
+
+# android.hardware.Sensor type ids the recorder registers
+SENSOR_TYPES = {
+    1: "accelerometer",
+    4: "gyroscope",
+    16: "gyroscope_uncalibrated",
+    35: "accelerometer_uncalibrated",
+}
+
+COPY_BUF = 1 << 20
+
+
+# ----------------------------------------------------------------------
+# IMU
+# ----------------------------------------------------------------------
+def parse_imu_csv(path) -> pd.DataFrame:
+    """
+    Parse the recorder's imu.csv into typed columns. The ';'-joined
+    'values' field is expanded to v0..vN in a single C-parser pass
+    (3 values for calibrated sensors, 6 for uncalibrated ones; missing
+    trailing values are NaN).
+    """
+    df = pd.read_csv(path, dtype={"mono_ns": np.int64, "sensor_ts_ns": np.int64,
+                                  "type": np.int32, "values": str})
+    values = df.pop("values").fillna("")
+    if len(df):
+        n_vals = int(values.str.count(";").max()) + 1
+        mat = pd.read_csv(
+            io.StringIO("\n".join(values)),
+            sep=";", header=None, names=[f"v{i}" for i in range(n_vals)],
+            dtype=np.float64, skip_blank_lines=False,
+        )
+        df = pd.concat([df, mat], axis=1)
+    return df
+
+
+def load_imu(session_dir) -> pd.DataFrame:
+    """The session's IMU table, from imu.npz if packed, else imu.csv."""
+    session_dir = Path(session_dir)
+    packed = session_dir / IMU_PACKED
+    if packed.exists():
+        with np.load(packed) as npz:
+            return pd.DataFrame({k: npz[k] for k in npz.files})
+    return parse_imu_csv(session_dir / IMU_CSV)
+
+
+# ----------------------------------------------------------------------
+# PACKING
+# ----------------------------------------------------------------------
+def list_frames(cam_dir) -> pd.DataFrame:
+    """One row per frame_*.bin with its index, size and dimensions."""
+    rows = []
+    with os.scandir(cam_dir) as it:
+        for entry in it:
+            m = FRAME_BIN_RE.match(entry.name)
+            if m:
+                rows.append((int(m.group(1)), entry.name, int(m.group(2)), int(m.group(3)),
+                             entry.stat().st_size))
+    frames = pd.DataFrame(rows, columns=["frame_idx", "name", "width", "height", "size"])
+    return frames.sort_values("frame_idx", ignore_index=True)
+
+
+def pack_session(session_dir, remove_loose: bool = False, out_dir=None) -> int:
+    """
+    Pack a recorder session: all frame .bin files into one contiguous
+    frames.bin, their JSON metadata into frames_index.npz (offset, size,
+    width, height, mono_ns, image_reader_timestamp_ns per frame), and
+    imu.csv into a typed imu.npz. Frames are copied one at a time, so
+    memory use does not depend on session length.
+
+    remove_loose=True deletes the per-frame files once the pack is
+    written. An existing pack is never replaced by one with fewer frames
+    (e.g. repacking after --remove-loose); that call leaves it as is.
+    out_dir writes the pack somewhere other than the session folder
+    (which is then only read). Returns the number of frames in the pack.
+    """
+    session_dir = Path(session_dir)
+    out_dir = session_dir if out_dir is None else Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cam_dir = session_dir / CAM_DIR
+    if cam_dir.is_dir():
+        frames = list_frames(cam_dir)
+    else:
+        frames = pd.DataFrame(columns=["frame_idx", "name", "width", "height", "size"])
+
+    n = len(frames)
+    index_path = out_dir / FRAMES_INDEX
+    if index_path.exists():
+        with np.load(index_path) as npz:
+            n_packed = len(npz["frame_idx"])
+        if n <= n_packed and (out_dir / FRAMES_FILE).exists():
+            return n_packed
+
+    offsets = np.zeros(n, dtype=np.int64)
+    mono_ns = np.full(n, -1, dtype=np.int64)
+    reader_ns = np.full(n, -1, dtype=np.int64)
+
+    tmp = out_dir / (FRAMES_FILE + ".tmp")
+    pos = 0
+    with open(tmp, "wb") as out:
+        for i, row in enumerate(frames.itertuples(index=False)):
+            offsets[i] = pos
+            with open(cam_dir / row.name, "rb") as f:
+                while True:
+                    buf = f.read(COPY_BUF)
+                    if not buf:
+                        break
+                    out.write(buf)
+            pos += row.size
+
+            meta_path = cam_dir / f"frame_{row.frame_idx:06d}.json"
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                mono_ns[i] = meta.get("mono_ns", -1)
+                reader_ns[i] = meta.get("image_reader_timestamp_ns", -1)
+            except (OSError, ValueError):
+                pass  # a frame whose metadata never got written keeps -1
+
+    # frames.bin first, index last: the index marks the session as packed,
+    # so a stale one must not outlive the frames.bin it describes
+    if index_path.exists():
+        os.remove(index_path)
+    os.replace(tmp, out_dir / FRAMES_FILE)
+    index_tmp = out_dir / (FRAMES_INDEX + ".tmp")
+    with open(index_tmp, "wb") as f:
+        np.savez(
+            f,
+            frame_idx=frames["frame_idx"].to_numpy(dtype=np.int64),
+            offset=offsets,
+            size=frames["size"].to_numpy(dtype=np.int64),
+            width=frames["width"].to_numpy(dtype=np.int32),
+            height=frames["height"].to_numpy(dtype=np.int32),
+            mono_ns=mono_ns,
+            image_reader_timestamp_ns=reader_ns,
+        )
+    os.replace(index_tmp, index_path)
+
+    if (session_dir / IMU_CSV).exists():
+        imu = parse_imu_csv(session_dir / IMU_CSV)
+        np.savez(out_dir / IMU_PACKED, **{c: imu[c].to_numpy() for c in imu.columns})
+
+    if remove_loose:
+        for row in frames.itertuples(index=False):
+            for name in (row.name, f"frame_{row.frame_idx:06d}.json"):
+                try:
+                    os.remove(cam_dir / name)
+                except OSError:
+                    pass
+
+    return n
+
+
+# ----------------------------------------------------------------------
+# LOADER
+# ----------------------------------------------------------------------
+class RecorderSession:
+    """
+    Packed recorder session. Frames are served as zero-copy memmap views
+    into frames.bin; nothing is read until a frame's bytes are touched.
+
+        s = RecorderSession("sessions/1718000000000")
+        y, u, v = s.frame(10)
+        y, u, v = s.frame_at(t_ns)            # nearest frame in time
+    """
+
+    def __init__(self, session_dir, pack: bool = True):
+        self.dir = Path(session_dir)
+        if not (self.dir / FRAMES_INDEX).exists():
+            if not pack:
+                raise FileNotFoundError(f"{self.dir} is not packed; run pack_session() first")
+            pack_session(self.dir)
+
+        with np.load(self.dir / FRAMES_INDEX) as npz:
+            self.index = pd.DataFrame({k: npz[k] for k in npz.files})
+
+        frames_path = self.dir / FRAMES_FILE
+        if frames_path.stat().st_size:
+            self._data = np.memmap(frames_path, dtype=np.uint8, mode="r")
+        else:
+            self._data = np.empty(0, dtype=np.uint8)
+        self._imu = None
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def imu(self) -> pd.DataFrame:
+        if self._imu is None:
+            self._imu = load_imu(self.dir)
+        return self._imu
+
+    def timestamps(self, clock: str = "image_reader_timestamp_ns") -> np.ndarray:
+        return self.index[clock].to_numpy()
+
+    def raw(self, i: int) -> np.ndarray:
+        """Flat I420 bytes of frame i (memmap view)."""
+        off = int(self.index["offset"].iat[i])
+        return self._data[off:off + int(self.index["size"].iat[i])]
+
+    def frame(self, i: int):
+        """(Y, U, V) planes of frame i as 2-D memmap views."""
+        w = int(self.index["width"].iat[i])
+        h = int(self.index["height"].iat[i])
+        buf = self.raw(i)
+        y_size, c_size = w * h, (w // 2) * (h // 2)
+        y = buf[:y_size].reshape(h, w)
+        u = buf[y_size:y_size + c_size].reshape(h // 2, w // 2)
+        v = buf[y_size + c_size:y_size + 2 * c_size].reshape(h // 2, w // 2)
+        return y, u, v
+
+    def index_at(self, t_ns: int, clock: str = "image_reader_timestamp_ns") -> int:
+        """
+        Position of the frame nearest to t_ns on the given clock. Frames
+        whose metadata was missing (timestamp -1) are never matched.
+        """
+        ts = self.timestamps(clock)
+        known = np.flatnonzero(ts >= 0)
+        if len(known) == 0:
+            raise LookupError(f"No frame in {self.dir} has a '{clock}' timestamp")
+
+        order = known[np.argsort(ts[known], kind="stable")]
+        sorted_ts = ts[order]
+        k = int(np.clip(np.searchsorted(sorted_ts, t_ns), 1, max(len(order) - 1, 1)))
+        k = min(k, len(order) - 1)
+        if k > 0 and abs(sorted_ts[k - 1] - t_ns) <= abs(sorted_ts[k] - t_ns):
+            k -= 1
+        return int(order[k])
+
+    def frame_at(self, t_ns: int, clock: str = "image_reader_timestamp_ns"):
+        return self.frame(self.index_at(t_ns, clock))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pack ML2NativeRecorder session folders into frames.bin + index + typed IMU."
+    )
+    parser.add_argument("sessions", nargs="+", type=Path, help="session folder(s)")
+    parser.add_argument("--remove-loose", action="store_true",
+                        help="delete per-frame .bin/.json files after packing")
+    args = parser.parse_args(argv)
+
+    for session_dir in args.sessions:
+        n = pack_session(session_dir, remove_loose=args.remove_loose)
+        size = (session_dir / FRAMES_FILE).stat().st_size
+        print(f"{session_dir}: packed {n} frames ({size / 1e6:.1f} MB)")
+
+        if (session_dir / IMU_PACKED).exists():
+            counts = load_imu(session_dir)["type"].value_counts().sort_index()
+            for sensor_type, count in counts.items():
+                name = SENSOR_TYPES.get(int(sensor_type), f"type {sensor_type}")
+                print(f"  {name}: {count} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from recorder_session import RecorderSession
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+PREFETCH_DEPTH = 8    # decoded frames allowed in flight ahead of the viewer
+WORKERS = 4
+STATS_EVERY = 100     # frames between stats lines
+
+# Both frames and IMU rows carry System.nanoTime() stamped on arrival,
+# so this is the one clock they share
+CLOCK = "mono_ns"
+
+ACC_TYPES = (1, 35)   # accelerometer (+ uncalibrated)
+GYRO_TYPES = (4, 16)  # gyroscope (+ uncalibrated)
+
+
+# ----------------------------------------------------------------------
+# DECODE
+# ----------------------------------------------------------------------
+def i420_to_rgb(y: np.ndarray, u: np.ndarray, v: np.ndarray, full_range: bool = True) -> np.ndarray:
+    """
+    BT.601 I420 -> (h, w, 3) uint8 RGB. Chroma terms are computed at
+    quarter resolution and broadcast over each 2x2 luma block, so no
+    upsampled U/V planes are ever materialised.
+    """
+    h, w = y.shape
+    yf = y.astype(np.float32).reshape(h // 2, 2, w // 2, 2)
+    uf = (u.astype(np.float32) - 128.0)[:, None, :, None]
+    vf = (v.astype(np.float32) - 128.0)[:, None, :, None]
+
+    if full_range:
+        r = yf + 1.402 * vf
+        g = yf - 0.344136 * uf - 0.714136 * vf
+        b = yf + 1.772 * uf
+    else:
+        yf = 1.164383 * (yf - 16.0)
+        r = yf + 1.596027 * vf
+        g = yf - 0.391762 * uf - 0.812968 * vf
+        b = yf + 2.017232 * uf
+
+    rgb = np.empty((h // 2, 2, w // 2, 2, 3), dtype=np.uint8)
+    for c, plane in enumerate((r, g, b)):
+        np.clip(plane, 0, 255, out=plane)
+        rgb[..., c] = plane
+    return rgb.reshape(h, w, 3)
+
+
+def _decode(session: RecorderSession, i: int, full_range: bool):
+    t0 = time.perf_counter()
+    rgb = i420_to_rgb(*session.frame(i), full_range=full_range)
+    return i, rgb, time.perf_counter() - t0
+
+
+# Process workers reopen the (packed) session once and keep it
+_worker_session = None
+
+
+def _init_worker(session_dir):
+    global _worker_session
+    _worker_session = RecorderSession(session_dir, pack=False)
+
+
+def _decode_in_worker(i: int, full_range: bool):
+    return _decode(_worker_session, i, full_range)
+
+
+class PrefetchStats:
+    """Running counters for the decode pipeline."""
+
+    def __init__(self):
+        self.frames = 0
+        self.decode_s = 0.0
+        self.wait_s = 0.0
+        self.stalls = 0
+        self.ready_sum = 0
+        self.start = time.perf_counter()
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        n = max(self.frames, 1)
+        return (
+            f"{self.frames} frames | delivered {self.frames / elapsed:6.1f} fps | "
+            f"decode {n / self.decode_s if self.decode_s else 0:6.1f} fps/worker | "
+            f"queue ready avg {self.ready_sum / n:4.1f} | "
+            f"stalls {self.stalls} ({self.wait_s:.2f}s)"
+        )
+
+
+def iter_decoded(session: RecorderSession, order=None, workers: int = WORKERS,
+                 depth: int = PREFETCH_DEPTH, processes: bool = False,
+                 full_range: bool = True, stats: PrefetchStats = None):
+    """
+    Yield (frame_position, rgb) in `order` while up to `depth` frames are
+    read and decoded ahead in a thread pool (NumPy releases the GIL for
+    the heavy array work) or, with processes=True, a process pool.
+    """
+    if order is None:
+        order = range(len(session))
+    stats = stats if stats is not None else PrefetchStats()
+
+    if processes:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(str(session.dir),))
+        submit = lambda i: pool.submit(_decode_in_worker, int(i), full_range)  # noqa: E731
+    else:
+        pool = ThreadPoolExecutor(workers)
+        submit = lambda i: pool.submit(_decode, session, int(i), full_range)  # noqa: E731
+
+    pending = deque()
+    it = iter(order)
+    try:
+        for i in it:
+            pending.append(submit(i))
+            if len(pending) >= depth:
+                break
+
+        while pending:
+            fut = pending.popleft()
+            stats.ready_sum += sum(f.done() for f in pending) + fut.done()
+            if not fut.done():
+                stats.stalls += 1
+                t0 = time.perf_counter()
+                fut.result()
+                stats.wait_s += time.perf_counter() - t0
+
+            i, rgb, dt = fut.result()
+            stats.decode_s += dt
+            stats.frames += 1
+
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append(submit(nxt))
+            yield i, rgb
+    finally:
+        for fut in pending:
+            fut.cancel()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# ----------------------------------------------------------------------
+# REPLAY
+# ----------------------------------------------------------------------
+def replay(session_dir, speed: float = 1.0, viewer: bool = True, workers: int = WORKERS,
+           depth: int = PREFETCH_DEPTH, processes: bool = False, full_range: bool = True,
+           max_frames: int = None) -> PrefetchStats:
+    """
+    Stream a recorder session's frames, in timestamp order and with the
+    IMU interleaved, to the Rerun viewer. speed=1 plays in real time,
+    2 twice as fast, 0 as fast as decoding allows.
+    """
+    session = RecorderSession(session_dir)
+    ts = session.timestamps(CLOCK)
+    order = np.argsort(ts, kind="stable")
+    order = order[ts[order] >= 0]
+    if max_frames is not None:
+        order = order[:max_frames]
+
+    imu = session.imu.sort_values(CLOCK, kind="stable") if len(session.imu) else session.imu
+    imu_t = imu[CLOCK].to_numpy() if len(imu) else np.empty(0, dtype=np.int64)
+    imu_pos = 0
+
+    if viewer:
+        import rerun as rr
+        rr.init("ML2 recorder replay", spawn=True)
+
+    stats = PrefetchStats()
+    t_first = int(ts[order[0]]) if len(order) else 0
+    wall_start = time.perf_counter()
+
+    for n, (i, rgb) in enumerate(iter_decoded(session, order, workers, depth, processes,
+                                              full_range, stats), start=1):
+        t_ns = int(ts[i])
+
+        if speed > 0:
+            target = wall_start + (t_ns - t_first) / 1e9 / speed
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        if viewer:
+            # IMU samples up to this frame's time, then the frame itself
+            end = int(np.searchsorted(imu_t, t_ns, side="right"))
+            for row in imu.iloc[imu_pos:end].itertuples(index=False):
+                rr.set_time_nanos("time", int(getattr(row, CLOCK)))
+                if row.type in ACC_TYPES:
+                    prefix = "imu/acc"
+                elif row.type in GYRO_TYPES:
+                    prefix = "imu/gyro"
+                else:
+                    continue
+                rr.log(f"{prefix}/x", rr.Scalars(np.array([row.v0], dtype=float)))
+                rr.log(f"{prefix}/y", rr.Scalars(np.array([row.v1], dtype=float)))
+                rr.log(f"{prefix}/z", rr.Scalars(np.array([row.v2], dtype=float)))
+            imu_pos = end
+
+            rr.set_time_nanos("time", t_ns)
+            rr.log("camera/rgb", rr.Image(rgb))
+
+        if n % STATS_EVERY == 0:
+            print("[replay]", stats.line())
+
+    print("[replay] done:", stats.line())
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay an ML2NativeRecorder session (camera + IMU) into Rerun."
+    )
+    parser.add_argument("session", help="session folder (packed on first use)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback rate; 1 = real time, 0 = as fast as possible")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--depth", type=int, default=PREFETCH_DEPTH, help="prefetch queue depth")
+    parser.add_argument("--processes", action="store_true", help="decode in processes instead of threads")
+    parser.add_argument("--limited-range", action="store_true", help="treat YUV as video (16-235) range")
+    parser.add_argument("--no-viewer", action="store_true", help="decode only; useful to measure fps")
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    replay(
+        args.session,
+        speed=args.speed,
+        viewer=not args.no_viewer,
+        workers=args.workers,
+        depth=args.depth,
+        processes=args.processes,
+        full_range=not args.limited_range,
+        max_frames=args.max_frames,
+    )
+
+
+if __name__ == "__main__":
+    main()
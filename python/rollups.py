@@ -0,0 +1,357 @@
+import argparse
+import json
+import math
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+TIERS_S = (1, 10, 60)         # bucket lengths, finest first
+ROLLUP_DIR = "rollups"        # next to imu.csv / headpose.csv
+STATS = ("min", "max", "mean", "std")
+
+CHUNK_ROWS = 200_000          # CSV rows read at a time when backfilling
+
+# Files written per stream into ROLLUP_DIR:
+#   <stream>.rollup.json      channels + tiers + record layout
+#   <stream>_<tier>s.bin      fixed-size little-endian records, appended
+#                             as each bucket closes:
+#                             t_ns int64 | sensor int16 | count int32 |
+#                             (min, max, mean, std) float32 per channel
+
+
+def record_struct(channels) -> struct.Struct:
+    return struct.Struct("<qhi" + "f" * (len(STATS) * len(channels)))
+
+
+def record_dtype(channels) -> np.dtype:
+    fields = [("t_ns", "<i8"), ("sensor", "<i2"), ("count", "<i4")]
+    fields += [(f"{c}_{s}", "<f4") for c in channels for s in STATS]
+    return np.dtype(fields)
+
+
+def tier_path(out_dir, stream: str, tier_s: int) -> Path:
+    return Path(out_dir) / f"{stream}_{tier_s}s.bin"
+
+
+def meta_path(out_dir, stream: str) -> Path:
+    return Path(out_dir) / f"{stream}.rollup.json"
+
+
+# ----------------------------------------------------------------------
+# BUCKET STATE
+# ----------------------------------------------------------------------
+class _Bucket:
+    """Running count / min / max / mean / M2 per channel for one bucket."""
+
+    __slots__ = ("key", "t_ns", "n", "mins", "maxs", "mean", "m2")
+
+    def __init__(self, key, t_ns, n, mins, maxs, mean, m2):
+        self.key = key
+        self.t_ns = t_ns
+        self.n = n
+        self.mins = mins
+        self.maxs = maxs
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_sample(cls, key, t_ns, values):
+        vals = [float(v) for v in values]
+        return cls(key, t_ns, 1, list(vals), list(vals), vals, [0.0] * len(vals))
+
+    def add_sample(self, values):
+        """Welford update: O(channels), no allocation."""
+        self.n += 1
+        n = self.n
+        mins, maxs, mean, m2 = self.mins, self.maxs, self.mean, self.m2
+        for j, v in enumerate(values):
+            if v < mins[j]:
+                mins[j] = v
+            if v > maxs[j]:
+                maxs[j] = v
+            d = v - mean[j]
+            mean[j] += d / n
+            m2[j] += d * (v - mean[j])
+
+    def merge(self, other: "_Bucket"):
+        """Fold another bucket in (Chan et al. parallel variance)."""
+        n = self.n + other.n
+        for j in range(len(self.mean)):
+            d = other.mean[j] - self.mean[j]
+            self.m2[j] += other.m2[j] + d * d * self.n * other.n / n
+            self.mean[j] += d * other.n / n
+            self.mins[j] = min(self.mins[j], other.mins[j])
+            self.maxs[j] = max(self.maxs[j], other.maxs[j])
+        self.n = n
+
+    def copy_as(self, key, t_ns) -> "_Bucket":
+        return _Bucket(key, t_ns, self.n, list(self.mins), list(self.maxs),
+                       list(self.mean), list(self.m2))
+
+    def fields(self):
+        out = []
+        for j in range(len(self.mean)):
+            out += (self.mins[j], self.maxs[j], self.mean[j], math.sqrt(max(self.m2[j], 0.0) / self.n))
+        return out
+
+
+# ----------------------------------------------------------------------
+# WRITER
+# ----------------------------------------------------------------------
+class RollupWriter:
+    """
+    Incremental min/max/mean/std rollups of one stream at several bucket
+    lengths, per sensor id.
+
+    Only the finest tier sees raw samples; when one of its buckets closes
+    it is written out and merged into the next tier up, and so on. State
+    is one open bucket per (sensor, tier), so memory is constant however
+    long the session runs. A bucket closes when a sample falls into a
+    different bucket, including when the device clock goes backwards at
+    a new app session.
+
+        rollups = RollupWriter(out_dir, "imu", IMU_CHANNELS)
+        rollups.update(t_ns, sensor_id, values)   # per sample
+        rollups.close()                            # flush open buckets
+
+    By default it appends to the rollups already in out_dir. With
+    fresh=True it writes to .tmp files that replace the old rollups only
+    on close(), so rebuilding a stream never duplicates buckets and a
+    failed rebuild (abort()) leaves the previous files as they were.
+    """
+
+    def __init__(self, out_dir, stream: str, channels, tiers_s=TIERS_S, fresh: bool = False):
+        self.out_dir = Path(out_dir)
+        self.stream = stream
+        self.channels = list(channels)
+        self.tiers_ns = [int(s * 1e9) for s in tiers_s]
+        self._struct = record_struct(self.channels)
+        self._open = {}   # sensor -> [bucket or None per tier]
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        meta = {"stream": stream, "channels": self.channels, "tiers_s": list(tiers_s),
+                "stats": list(STATS), "record_size": self._struct.size}
+        mp = meta_path(self.out_dir, stream)
+        paths = [mp] + [tier_path(self.out_dir, stream, s) for s in tiers_s]
+        if fresh:
+            # (final, tmp) pairs, renamed into place by close()
+            self._replace = [(p, p.with_name(p.name + ".tmp")) for p in paths]
+            paths = [tmp for _, tmp in self._replace]
+        else:
+            self._replace = []
+            if mp.exists():
+                with open(mp, "r", encoding="utf-8") as f:
+                    old = json.load(f)
+                if old != meta:
+                    raise ValueError(f"{mp} was written with a different layout; "
+                                     f"move the old rollups aside first")
+        if fresh or not mp.exists():
+            with open(paths[0], "w", encoding="utf-8") as f:
+                json.dump(meta, f, indent=2)
+
+        mode = "wb" if fresh else "ab"
+        self._files = [open(p, mode) for p in paths[1:]]
+
+    def update(self, t_ns: int, sensor: int, values):
+        level = self._open.get(sensor)
+        if level is None:
+            level = self._open[sensor] = [None] * len(self.tiers_ns)
+
+        period = self.tiers_ns[0]
+        key = t_ns // period
+        b = level[0]
+        if b is not None and b.key == key:
+            b.add_sample(values)
+            return
+        if b is not None:
+            self._close(sensor, 0, b)
+        level[0] = _Bucket.from_sample(key, key * period, values)
+
+    def push_bucket(self, sensor: int, bucket: _Bucket):
+        """Feed a pre-aggregated finest-tier bucket (used when backfilling)."""
+        level = self._open.setdefault(sensor, [None] * len(self.tiers_ns))
+        b = level[0]
+        if b is not None and b.key == bucket.key:
+            b.merge(bucket)
+            return
+        if b is not None:
+            self._close(sensor, 0, b)
+        level[0] = bucket
+
+    def _close(self, sensor: int, tier: int, bucket: _Bucket):
+        """Write a finished bucket and cascade it into the next tier."""
+        f = self._files[tier]
+        f.write(self._struct.pack(bucket.t_ns, sensor, bucket.n, *bucket.fields()))
+        f.flush()
+        if tier + 1 == len(self.tiers_ns):
+            return
+
+        level = self._open[sensor]
+        period = self.tiers_ns[tier + 1]
+        key = bucket.t_ns // period
+        up = level[tier + 1]
+        if up is not None and up.key == key:
+            up.merge(bucket)
+            return
+        if up is not None:
+            self._close(sensor, tier + 1, up)
+        level[tier + 1] = bucket.copy_as(key, key * period)
+
+    def close(self):
+        """Write out every still-open bucket, finest tier first, and close."""
+        for sensor, level in self._open.items():
+            for tier in range(len(level)):
+                if level[tier] is not None:
+                    b, level[tier] = level[tier], None
+                    self._close(sensor, tier, b)
+        self._open.clear()
+        for f in self._files:
+            f.close()
+        # tier files first, meta last
+        for final, tmp in self._replace[1:] + self._replace[:1]:
+            os.replace(tmp, final)
+        self._replace = []
+
+    def abort(self):
+        """Close without flushing; a fresh writer's .tmp files are removed."""
+        self._open.clear()
+        for f in self._files:
+            f.close()
+        for _, tmp in self._replace:
+            tmp.unlink(missing_ok=True)
+        self._replace = []
+
+
+# ----------------------------------------------------------------------
+# BACKFILL
+# ----------------------------------------------------------------------
+def rollup_csv(csv_path, out_dir, stream: str, channels, tiers_s=TIERS_S,
+               sensor_col: str = "sensorId", chunksize: int = CHUNK_ROWS) -> int:
+    """
+    Build rollups for an existing imu.csv / headpose.csv. The finest tier
+    is aggregated per chunk with reduceat over runs of equal bucket;
+    only one row per finished bucket goes through the Python cascade.
+    Any rollups of this stream already in out_dir are replaced, not
+    appended to. Returns the number of samples read.
+    """
+    import pandas as pd
+
+    writer = RollupWriter(out_dir, stream, channels, tiers_s, fresh=True)
+    period = writer.tiers_ns[0]
+    n_rows = 0
+    try:
+        for chunk in pd.read_csv(csv_path, usecols=["t_ns", sensor_col] + list(channels),
+                                 chunksize=chunksize):
+            n_rows += len(chunk)
+            for sensor, part in chunk.groupby(sensor_col, sort=False):
+                t = part["t_ns"].to_numpy(dtype=np.int64)
+                x = part[list(channels)].to_numpy(dtype=np.float64)
+                key = t // period
+                starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+                counts = np.diff(np.r_[starts, len(t)])
+
+                mean = np.add.reduceat(x, starts, axis=0) / counts[:, None]
+                dev = x - np.repeat(mean, counts, axis=0)
+                m2 = np.add.reduceat(dev * dev, starts, axis=0)
+                mins = np.minimum.reduceat(x, starts, axis=0)
+                maxs = np.maximum.reduceat(x, starts, axis=0)
+
+                for r, s in enumerate(starts):
+                    k = int(key[s])
+                    writer.push_bucket(int(sensor), _Bucket(
+                        k, k * period, int(counts[r]), mins[r].tolist(), maxs[r].tolist(),
+                        mean[r].tolist(), m2[r].tolist(),
+                    ))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return n_rows
+
+
+# ----------------------------------------------------------------------
+# READER
+# ----------------------------------------------------------------------
+def load_rollup(out_dir, stream: str, tier_s: int):
+    """
+    One rollup tier as a DataFrame: t_ns, sensor, count and
+    <channel>_{min,max,mean,std}. The file is memory-mapped, and a
+    trailing partial record (writer killed mid-write) is ignored.
+    """
+    import pandas as pd
+
+    with open(meta_path(out_dir, stream), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    dtype = record_dtype(meta["channels"])
+    path = tier_path(out_dir, stream, tier_s)
+    n = os.path.getsize(path) // dtype.itemsize if path.exists() else 0
+    if n == 0:
+        return pd.DataFrame(np.empty(0, dtype=dtype))
+    recs = np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+    return pd.DataFrame(recs)
+
+
+def plot_overview(out_dir, stream: str, tier_s: int, channels=None, sensor: int = None):
+    """Mean per bucket with the min..max envelope shaded, one axis per channel."""
+    import matplotlib.pyplot as plt
+
+    df = load_rollup(out_dir, stream, tier_s)
+    if sensor is not None:
+        df = df[df["sensor"] == sensor]
+    if channels is None:
+        with open(meta_path(out_dir, stream), "r", encoding="utf-8") as f:
+            channels = json.load(f)["channels"]
+
+    # Rows are in write order, which is time order within each app session
+    x = np.arange(len(df))
+    fig, axes = plt.subplots(len(channels), 1, sharex=True, figsize=(10, 2 * len(channels)))
+    for ax, c in zip(np.atleast_1d(axes), channels):
+        ax.fill_between(x, df[f"{c}_min"], df[f"{c}_max"], alpha=0.3, linewidth=0)
+        ax.plot(x, df[f"{c}_mean"], linewidth=0.8)
+        ax.set_ylabel(c)
+        ax.grid(True)
+    np.atleast_1d(axes)[-1].set_xlabel(f"{tier_s}s bucket")
+    fig.suptitle(f"{stream}: {len(df)} x {tier_s}s rollups")
+    plt.tight_layout()
+    plt.show()
+
+
+def main(argv=None):
+    from server import HEADPOSE_CHANNELS, IMU_CHANNELS
+
+    streams = {"imu": IMU_CHANNELS, "headpose": HEADPOSE_CHANNELS}
+    parser = argparse.ArgumentParser(
+        description="Backfill or plot multi-resolution rollups of imu.csv / headpose.csv."
+    )
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("backfill", help="build rollups from an existing CSV")
+    b.add_argument("csv", help="path/to/imu.csv or headpose.csv")
+    b.add_argument("--stream", choices=sorted(streams), default=None,
+                   help="defaults to the CSV's file name")
+    b.add_argument("--out-dir", default=None, help=f"default: <csv folder>/{ROLLUP_DIR}")
+
+    p = sub.add_parser("plot", help="overview plot from saved rollups")
+    p.add_argument("out_dir", help="rollup folder")
+    p.add_argument("stream", choices=sorted(streams))
+    p.add_argument("--tier", type=int, default=TIERS_S[-1], help="bucket length in s")
+    p.add_argument("--sensor", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "backfill":
+        stream = args.stream or Path(args.csv).stem
+        out_dir = args.out_dir or Path(args.csv).parent / ROLLUP_DIR
+        n = rollup_csv(args.csv, out_dir, stream, streams[stream])
+        sizes = ", ".join(f"{s}s: {len(load_rollup(out_dir, stream, s))}" for s in TIERS_S)
+        print(f"{args.csv}: {n} samples -> {sizes} rows in {out_dir}")
+    else:
+        plot_overview(args.out_dir, args.stream, args.tier, sensor=args.sensor)
+
+
+if __name__ == "__main__":
+    main()
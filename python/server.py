@@ -4,6 +4,9 @@ import csv
 import os
 from datetime import datetime, timezone
 
+from rollups import ROLLUP_DIR, RollupWriter
+from stream_health import StreamMonitor
+
 HOST = "0.0.0.0"
 PORT = 5000
 
@@ -12,14 +15,21 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 OUT_DIR = os.path.join(SCRIPT_DIR, "ML2_readings")
 
 HEADER_SIZE = 16  # !BBHQI
+HEADER_STRUCT = struct.Struct("!BBHQI")  # type, sensorId, reserved, t_ns, payload_len
 
 # Payload sizes (bytes)
 IMU_PAYLOAD_SIZE = 9 * 4        # 9 floats
 HEADPOSE_PAYLOAD_SIZE = 7 * 4   # 7 floats
 
+IMU_STRUCT = struct.Struct("!9f")
+HEADPOSE_STRUCT = struct.Struct("!7f")
+
 TYPE_IMU = 1
 TYPE_HEADPOSE = 2
 
+IMU_CHANNELS = ("accx", "accy", "accz", "gyrox", "gyroy", "gyroz", "magx", "magy", "magz")
+HEADPOSE_CHANNELS = ("px", "py", "pz", "qx", "qy", "qz", "qw")
+
 
 def read_exact(conn, n: int) -> bytes:
     data = b""
@@ -31,6 +41,12 @@ def read_exact(conn, n: int) -> bytes:
     return data
 
 
+def parse_header(header: bytes):
+    """(type_byte, sensor_id, t_ns, payload_len) from a 16-byte packet header."""
+    type_byte, sensor_id, _, t_ns, payload_len = HEADER_STRUCT.unpack(header)
+    return type_byte, sensor_id, t_ns, payload_len
+
+
 def open_imu_csv():
     os.makedirs(OUT_DIR, exist_ok=True)
     path = os.path.join(OUT_DIR, "imu.csv")
@@ -83,15 +99,22 @@ def handle_client(conn: socket.socket, addr):
     imu_f, imu_w = open_imu_csv()
     pose_f, pose_w = open_headpose_csv()
 
+    # Rate / jitter / gap / frozen-channel checks on the device clock,
+    # summarised every few seconds while the client is connected
+    imu_health = StreamMonitor("imu", IMU_CHANNELS)
+    pose_health = StreamMonitor("headpose", HEADPOSE_CHANNELS)
+
+    # 1 s / 10 s / 1 min min-max-mean-std per channel, for overview plots
+    rollup_dir = os.path.join(OUT_DIR, ROLLUP_DIR)
+    imu_rollups = RollupWriter(rollup_dir, "imu", IMU_CHANNELS)
+    pose_rollups = RollupWriter(rollup_dir, "headpose", HEADPOSE_CHANNELS)
+
     try:
         while True:
             # ---- 1) Header ----
             header = read_exact(conn, HEADER_SIZE)
 
-            type_byte = header[0]
-            sensor_id = header[1]
-            t_ns = struct.unpack("!Q", header[4:12])[0]
-            payload_len = struct.unpack("!I", header[12:16])[0]
+            type_byte, sensor_id, t_ns, payload_len = parse_header(header)
 
             # ---- 2) Dispatch by type ----
 
@@ -102,7 +125,10 @@ def handle_client(conn: socket.socket, addr):
                     continue
 
                 payload = read_exact(conn, payload_len)
-                ax, ay, az, gx, gy, gz, mx, my, mz = struct.unpack("!9f", payload)
+                values = IMU_STRUCT.unpack(payload)
+                ax, ay, az, gx, gy, gz, mx, my, mz = values
+                imu_health.update(t_ns, values)
+                imu_rollups.update(t_ns, sensor_id, values)
 
                 server_time_iso = datetime.now(timezone.utc).isoformat()
 
@@ -124,7 +150,10 @@ def handle_client(conn: socket.socket, addr):
                     continue
 
                 payload = read_exact(conn, payload_len)
-                px, py, pz, qx, qy, qz, qw = struct.unpack("!7f", payload)
+                values = HEADPOSE_STRUCT.unpack(payload)
+                px, py, pz, qx, qy, qz, qw = values
+                pose_health.update(t_ns, values)
+                pose_rollups.update(t_ns, sensor_id, values)
 
                 server_time_iso = datetime.now(timezone.utc).isoformat()
 
@@ -146,6 +175,10 @@ def handle_client(conn: socket.socket, addr):
     except ConnectionError as e:
         print(f"[server] Client disconnected: {e}")
     finally:
+        imu_health.print_summary()
+        pose_health.print_summary()
+        imu_rollups.close()
+        pose_rollups.close()
         imu_f.close()
         pose_f.close()
         conn.close()
@@ -0,0 +1,364 @@
+import argparse
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+# CONFIG
+# ----------------------------------------------------------------------
+# Inter-arrival times go into a fixed log-spaced histogram, so jitter
+# percentiles cost O(1) memory and O(1) per sample.
+HIST_MIN_S = 1e-6
+HIST_DECADES = 8              # 1 us .. 100 s
+HIST_BINS_PER_DECADE = 40     # ~6% bin width
+HIST_BINS = HIST_DECADES * HIST_BINS_PER_DECADE
+
+GAP_FACTOR = 5.0              # gap = dt > GAP_FACTOR * median dt (unless gap_s given)
+FROZEN_SAMPLES = 50           # identical values in a row before a channel counts as frozen
+SUMMARY_EVERY_S = 10.0
+MAX_EVENTS = 100              # recent gaps kept for the summary
+
+_LOG_MIN = math.log10(HIST_MIN_S)
+
+
+def _dt_bin(dt_s: float) -> int:
+    if dt_s <= HIST_MIN_S:
+        return 0
+    return min(HIST_BINS - 1, int((math.log10(dt_s) - _LOG_MIN) * HIST_BINS_PER_DECADE))
+
+
+def _dt_bins(dt_s: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        b = ((np.log10(np.maximum(dt_s, HIST_MIN_S)) - _LOG_MIN) * HIST_BINS_PER_DECADE).astype(np.int64)
+    return np.clip(b, 0, HIST_BINS - 1)
+
+
+def _bin_centre_s(b) -> float:
+    return 10 ** (_LOG_MIN + (np.asarray(b) + 0.5) / HIST_BINS_PER_DECADE)
+
+
+class StreamMonitor:
+    """
+    Incremental health monitor for one sensor stream.
+
+    Tracks effective rate, inter-arrival jitter percentiles, gaps,
+    duplicate and backwards timestamps, all-zero samples and frozen
+    (constant) channels. update() is O(1) per sample and allocates
+    nothing, so it can sit inside an ingest loop; update_many() does the
+    same bookkeeping vectorized, for replaying existing files.
+
+    Alerts go to on_alert(stream_name, message) (print by default), a
+    summary is printed every summary_every_s when report=True.
+    """
+
+    def __init__(self, name: str, channels=(), gap_s: float = None,
+                 frozen_samples: int = FROZEN_SAMPLES, summary_every_s: float = SUMMARY_EVERY_S,
+                 report: bool = True, on_alert=None):
+        self.name = name
+        self.channels = list(channels)
+        self.gap_s = gap_s
+        self.frozen_samples = frozen_samples
+        self.summary_every_s = summary_every_s
+        self.report = report
+        self.on_alert = on_alert or (lambda name, msg: print(f"[health:{name}] ALERT {msg}"))
+
+        self.count = 0
+        self.first_t = None
+        self.last_t = None
+        self.hist = np.zeros(HIST_BINS, dtype=np.int64)
+        self.duplicates = 0
+        self.backwards = 0
+        self.gaps = 0
+        self.gap_total_s = 0.0
+        self.recent_gaps = deque(maxlen=MAX_EVENTS)
+        self.zero_rows = 0
+        self.active_ns = 0        # sum of forward inter-arrival times
+
+        n = len(self.channels)
+        self._last_vals = [None] * n
+        self._run = [0] * n
+        self.frozen = [False] * n
+        self._last_key = None
+
+        self._gap_thresh_ns = None if gap_s is None else int(gap_s * 1e9)
+        self._next_summary = time.monotonic() + summary_every_s
+        self._window_count = 0
+        self._window_start = time.monotonic()
+
+    # -- gap threshold -------------------------------------------------
+    def _refresh_gap_threshold(self):
+        if self.gap_s is not None:
+            return
+        if self.hist.sum() >= 20:
+            self._gap_thresh_ns = int(GAP_FACTOR * self.percentile(50) * 1e9)
+
+    # -- per-sample ----------------------------------------------------
+    def update(self, t_ns: int, values=None, key=None):
+        """
+        Feed one sample. values are this sample's channel values (same
+        order as channels); key, if given, is compared with the previous
+        sample's key to spot repeated packets (e.g. a raw BLE payload).
+        """
+        self.count += 1
+        self._window_count += 1
+
+        dup = False
+        if self.last_t is None:
+            self.first_t = t_ns
+        else:
+            dt = t_ns - self.last_t
+            if dt < 0:
+                self.backwards += 1
+            elif dt == 0 or (key is not None and key == self._last_key):
+                self.duplicates += 1
+                dup = True
+            else:
+                self.hist[_dt_bin(dt / 1e9)] += 1
+                self.active_ns += dt
+                if self._gap_thresh_ns is not None and dt > self._gap_thresh_ns:
+                    self._record_gap(self.last_t, dt)
+        if self.count == 32 or (self.count & 0xFF) == 0:
+            self._refresh_gap_threshold()
+        self.last_t = t_ns
+        self._last_key = key
+
+        # A repeated packet says nothing new about the values
+        if values is not None and not dup:
+            all_zero = True
+            for j, v in enumerate(values):
+                if v != 0:
+                    all_zero = False
+                if v == self._last_vals[j]:
+                    self._run[j] += 1
+                    if self._run[j] == self.frozen_samples:
+                        self._alert_frozen(j, v)
+                else:
+                    self._last_vals[j] = v
+                    self._run[j] = 1
+                    self.frozen[j] = False
+            if all_zero:
+                self.zero_rows += 1
+                if self.zero_rows == 1:
+                    self.on_alert(self.name, f"all-zero sample at t={t_ns}")
+
+        if self.report and time.monotonic() >= self._next_summary:
+            self.print_summary()
+
+    def _record_gap(self, t_ns, dt_ns):
+        self.gaps += 1
+        self.gap_total_s += dt_ns / 1e9
+        self.recent_gaps.append((t_ns, dt_ns))
+        self.on_alert(self.name, f"gap of {dt_ns / 1e6:.1f} ms after t={t_ns}")
+
+    def _alert_frozen(self, j, v):
+        self.frozen[j] = True
+        self.on_alert(self.name, f"channel '{self.channels[j]}' frozen at {v} "
+                                 f"for {self.frozen_samples}+ samples")
+
+    # -- batch ---------------------------------------------------------
+    def update_many(self, t_ns, values=None, keys=None):
+        """
+        Vectorized equivalent of calling update() for every row:
+        t_ns (N,), values (N, channels), keys (N,) or None.
+        """
+        t = np.asarray(t_ns, dtype=np.int64)
+        n = len(t)
+        if n == 0:
+            return
+
+        # The gap threshold is refreshed at the same sample counts as in
+        # update(), so process the batch in pieces ending at those counts
+        start = 0
+        while start < n:
+            mark = 32 if self.count < 32 else ((self.count >> 8) + 1) << 8
+            stop = min(n, start + mark - self.count)
+            self._update_block(t[start:stop],
+                               None if values is None else values[start:stop],
+                               None if keys is None else keys[start:stop])
+            if self.count == mark:
+                self._refresh_gap_threshold()
+            start = stop
+
+        if self.report and time.monotonic() >= self._next_summary:
+            self.print_summary()
+
+    def _update_block(self, t, values, keys):
+        n = len(t)
+        self.count += n
+        self._window_count += n
+
+        prev = np.empty_like(t)
+        prev[1:] = t[:-1]
+        has_prev = np.ones(n, dtype=bool)
+        if self.last_t is None:
+            self.first_t = int(t[0])
+            has_prev[0] = False
+            prev[0] = t[0]
+        else:
+            prev[0] = self.last_t
+        dt = t - prev
+
+        if keys is not None:
+            keys = np.asarray(keys)
+            prev_keys = np.empty_like(keys)
+            prev_keys[1:] = keys[:-1]
+            prev_keys[0] = keys[0] if self._last_key is None else self._last_key
+            same_key = keys == prev_keys
+            same_key[0] &= self._last_key is not None
+        else:
+            same_key = np.zeros(n, dtype=bool)
+
+        back = has_prev & (dt < 0)
+        dup = has_prev & ~back & ((dt == 0) | same_key)
+        normal = has_prev & ~back & ~dup
+
+        self.backwards += int(back.sum())
+        self.duplicates += int(dup.sum())
+        self.hist += np.bincount(_dt_bins(dt[normal] / 1e9), minlength=HIST_BINS)
+        self.active_ns += int(dt[normal].sum())
+
+        if self._gap_thresh_ns is not None:
+            for k in np.flatnonzero(normal & (dt > self._gap_thresh_ns)):
+                self._record_gap(int(prev[k]), int(dt[k]))
+
+        self.last_t = int(t[-1])
+        self._last_key = None if keys is None else keys[-1]
+
+        if values is not None and not dup.all():
+            vals = np.asarray(values, dtype=np.float64).reshape(n, len(self.channels))[~dup]
+            zero = np.all(vals == 0, axis=1)
+            if zero.any() and self.zero_rows == 0:
+                self.on_alert(self.name, f"all-zero sample at t={int(t[~dup][np.argmax(zero)])}")
+            self.zero_rows += int(zero.sum())
+
+            for j in range(len(self.channels)):
+                self._frozen_runs(j, vals[:, j])
+
+    def _frozen_runs(self, j, col):
+        """Carry run lengths of identical values across the batch."""
+        prev = np.empty_like(col)
+        prev[1:] = col[:-1]
+        prev[0] = np.nan if self._last_vals[j] is None else self._last_vals[j]
+        same = col == prev
+
+        pos = np.arange(len(col))
+        start = np.maximum.accumulate(np.where(same, -1, pos))
+        run = pos - start + np.where(start < 0, self._run[j], 1)
+
+        for k in np.flatnonzero(run == self.frozen_samples):
+            self._alert_frozen(j, col[k])
+
+        self._last_vals[j] = col[-1]
+        self._run[j] = int(run[-1])
+        self.frozen[j] = self._run[j] >= self.frozen_samples
+
+    # -- reporting -----------------------------------------------------
+    def percentile(self, p: float) -> float:
+        """Inter-arrival time (s) at percentile p, from the histogram."""
+        total = self.hist.sum()
+        if total == 0:
+            return float("nan")
+        b = int(np.searchsorted(np.cumsum(self.hist), p / 100.0 * total))
+        return float(_bin_centre_s(min(b, HIST_BINS - 1)))
+
+    def summary(self) -> dict:
+        # Rate over forward steps only, so device clock resets and
+        # duplicates don't distort it
+        span_s = self.active_ns / 1e9
+        n_steps = int(self.hist.sum())
+        now = time.monotonic()
+        window_s = now - self._window_start
+        return {
+            "stream": self.name,
+            "samples": self.count,
+            "first_t_ns": self.first_t,
+            "last_t_ns": self.last_t,
+            "rate_hz": n_steps / span_s if span_s > 0 else float("nan"),
+            "recent_rate_hz": self._window_count / window_s if window_s > 0 else float("nan"),
+            "dt_p50_ms": self.percentile(50) * 1e3,
+            "dt_p95_ms": self.percentile(95) * 1e3,
+            "dt_p99_ms": self.percentile(99) * 1e3,
+            "gaps": self.gaps,
+            "gap_total_s": self.gap_total_s,
+            "duplicates": self.duplicates,
+            "backwards": self.backwards,
+            "zero_rows": self.zero_rows,
+            "frozen": [c for c, f in zip(self.channels, self.frozen) if f],
+        }
+
+    def print_summary(self):
+        s = self.summary()
+        print(
+            f"[health:{s['stream']}] n={s['samples']} rate={s['rate_hz']:.1f}Hz "
+            f"(recent {s['recent_rate_hz']:.1f}/s) dt p50/p95/p99="
+            f"{s['dt_p50_ms']:.1f}/{s['dt_p95_ms']:.1f}/{s['dt_p99_ms']:.1f}ms "
+            f"gaps={s['gaps']} dup={s['duplicates']} back={s['backwards']} "
+            f"zero={s['zero_rows']} frozen={','.join(s['frozen']) or '-'}"
+        )
+        self._next_summary = time.monotonic() + self.summary_every_s
+        self._window_count = 0
+        self._window_start = time.monotonic()
+
+
+# ----------------------------------------------------------------------
+# OFFLINE
+# ----------------------------------------------------------------------
+# How to read each known CSV: (time column, channel columns, duplicate key column)
+CSV_LAYOUTS = {
+    "imu": ("t_ns", ["accx", "accy", "accz", "gyrox", "gyroy", "gyroz", "magx", "magy", "magz"], None),
+    "headpose": ("t_ns", ["px", "py", "pz", "qx", "qy", "qz", "qw"], None),
+    "hera_advert": ("pc_time", ["heart_rate_bpm", "respiration_rate_bpm", "temperature_c"], "raw_hex"),
+    "hera_repdat1": ("pc_time", [], "values"),
+    "hera_hr_temp": ("pc_time", [], "value"),
+}
+
+
+def guess_layout(path) -> str:
+    name = str(path).lower()
+    for kind in ("hera_advert", "hera_repdat1", "hera_hr_temp", "headpose", "imu"):
+        if kind in name:
+            return kind
+    raise ValueError(f"Can't tell what kind of stream {path} is; pass --kind")
+
+
+def monitor_csv(path, kind: str = None, chunksize: int = 200_000, **kwargs) -> StreamMonitor:
+    """Run a StreamMonitor over an existing recording, chunk by chunk."""
+    # Offline only, so the live collectors don't pay for pandas
+    import pandas as pd
+    from csv_cache import TIME_COLUMNS, parse_time_ns
+
+    kind = kind or guess_layout(path)
+    time_col, channels, key_col = CSV_LAYOUTS[kind]
+    mon = StreamMonitor(kind, channels, report=False, **kwargs)
+
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if time_col == "t_ns":
+            t = chunk["t_ns"].to_numpy(dtype=np.int64)
+        else:
+            t = parse_time_ns(chunk[time_col], TIME_COLUMNS[time_col])
+        vals = chunk[channels].to_numpy(dtype=np.float64) if channels else None
+        keys = chunk[key_col].astype(str).to_numpy() if key_col else None
+        mon.update_many(t, vals, keys)
+    return mon
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream-health report for recorded CSVs.")
+    parser.add_argument("paths", nargs="+", help="imu.csv / headpose.csv / hera_*.csv")
+    parser.add_argument("--kind", choices=sorted(CSV_LAYOUTS), default=None)
+    parser.add_argument("--gap-s", type=float, default=None,
+                        help=f"gap threshold in s (default: {GAP_FACTOR:g} x median dt)")
+    parser.add_argument("--frozen", type=int, default=FROZEN_SAMPLES,
+                        help="identical samples in a row before a channel is 'frozen'")
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        print(f"== {path}")
+        mon = monitor_csv(path, args.kind, gap_s=args.gap_s, frozen_samples=args.frozen)
+        mon.print_summary()
+
+
+if __name__ == "__main__":
+    main()